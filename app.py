@@ -1,176 +1,242 @@
-from flask import Flask, session, render_template, request, redirect, url_for, flash, make_response, jsonify
-import random, io, csv
+from flask import Flask, session, request, redirect, url_for, flash, make_response, jsonify, Response, g, abort
+from flask import stream_with_context
+from flask import render_template as flask_render_template
+import io, csv, json, os, hmac, math, time
 from datetime import datetime
 
-# Constants for game costs and values
-WOODCUTTER_COST = 3       # Cost in trees to buy one woodcutter
-EXCHANGE_VALUE = 1        # Victory points gained per woodcutter exchanged
-
-# Descriptive names for scenario variants
-SCENARIO_NAMES = {
-    1: "Overshoot & Collapse",
-    2: "Hubbert Curve",
-    3: "Sustainable Scenario"
-}
-
-class Player:
-    def __init__(self):
-        self.woodcutters = 1
-        self.victory_points = 0
-        self.harvested_trees = 0
-        self.replanted = 0
-        self.exchanges_this_round = 0
-        self.has_harvested = False
-        self.total_vp_gained = 0
-
-class GameModel:
-    def __init__(self, variant, players_info):
-        self.players = [Player(), Player()]
-        self.forest = 100
-        self.current_round = 0
-        self.variant = variant                # 1, 2, or 3 (scenario variant)
-        self.current_player = 0              # 0 = Player1's turn, 1 = Player2's turn
-        self.game_over = False
-        self.replant_buffer = 0             # trees scheduled to grow next round from replanting
-        self.players_info = players_info    # list of player info dictionaries
-        self.round_stats = []              # history of each round's stats (for CSV log)
-        self.log_messages = []             # event log for the game (messages to display)
-
-    def harvest(self):
-        """Perform a harvest action for the current player. Returns number of trees harvested."""
-        player = self.players[self.current_player]
-        total_harvest = 0
-        # Each woodcutter rolls a 6-sided die: 5-6 yields 2 trees, 2-4 yields 1, 1 yields 0
-        for _ in range(player.woodcutters):
-            roll = random.randint(1, 6)
-            if roll >= 5:
-                total_harvest += 2
-            elif roll >= 2:
-                total_harvest += 1
-        actual_harvest = min(total_harvest, self.forest)  # cannot harvest more trees than remain
-        self.forest -= actual_harvest
-        player.harvested_trees += actual_harvest
-        player.has_harvested = True
-        return actual_harvest
-
-    def replant(self, amount):
-        """Schedule replanting of `amount` harvested trees (3 new trees next round per tree)."""
-        player = self.players[self.current_player]
-        max_possible = min(player.harvested_trees, (100 - self.forest - self.replant_buffer) // 3)
-        if amount <= max_possible:
-            player.harvested_trees -= amount
-            player.replanted += amount
-            self.replant_buffer += amount * 3  # these trees will regrow next round
-            return True
-        return False
-
-    def buy_vp(self, amount):
-        """Convert harvested trees to Victory Points (2 trees = 1 VP)."""
-        player = self.players[self.current_player]
-        max_possible = player.harvested_trees // 2
-        if amount <= max_possible:
-            player.victory_points += amount
-            player.total_vp_gained += amount
-            player.harvested_trees -= amount * 2
-            return True
-        return False
-
-    def buy_wc(self, amount):
-        """Buy additional woodcutters (3 trees = 1 woodcutter)."""
-        player = self.players[self.current_player]
-        max_possible = player.harvested_trees // WOODCUTTER_COST
-        if amount <= max_possible:
-            player.woodcutters += amount
-            player.harvested_trees -= amount * WOODCUTTER_COST
-            return True
-        return False
-
-    def exchange_wc(self):
-        """Exchange one woodcutter for victory points (limited to 2 exchanges per round)."""
-        player = self.players[self.current_player]
-        if player.woodcutters > 1 and player.exchanges_this_round < 2:
-            player.woodcutters -= 1
-            player.victory_points += EXCHANGE_VALUE
-            player.total_vp_gained += EXCHANGE_VALUE
-            player.exchanges_this_round += 1
-            return "exchanged"
-        elif player.exchanges_this_round >= 2:
-            return "limit"   # already exchanged twice this round
-        else:
-            return "min_wc"  # cannot exchange because only 1 woodcutter left
-
-    def end_round(self):
-        """Handle end-of-round updates: replant growth and scenario-specific effects."""
-        # Grow trees from replanting (up to forest max 100)
-        self.forest = min(self.forest + self.replant_buffer, 100)
-        # Record round statistics for logging
-        round_entry = {
-            'round': self.current_round,
-            'trees': self.forest,
-            'p1_replanted': self.players[0].replanted,
-            'p2_replanted': self.players[1].replanted,
-            'p1_harvested': self.players[0].harvested_trees,
-            'p1_woodcutters': self.players[0].woodcutters,
-            'p1_vp': self.players[0].victory_points,
-            'p2_harvested': self.players[1].harvested_trees,
-            'p2_woodcutters': self.players[1].woodcutters,
-            'p2_vp': self.players[1].victory_points
-        }
-        self.round_stats.append(round_entry)
-        # Reset per-round replant and exchange counters
-        self.replant_buffer = 0
-        for player in self.players:
-            player.replanted = 0
-            player.exchanges_this_round = 0
-        # Sustainable Scenario (variant 3): bonus VPs every 5 rounds (based on 10% of forest)
-        if self.variant == 3 and self.current_round % 5 == 0:
-            bonus = self.forest // 10
-            for player in self.players:
-                player.victory_points += bonus
-                player.total_vp_gained += bonus
-        # Check end-game conditions: forest depletion or reaching round 20
-        if self.forest <= 0 or self.current_round >= 20:
-            self.game_over = True
-
-    def end_game(self):
-        """Apply final game rules at game over: convert leftover trees to VPs, apply penalties/bonuses, determine winner."""
-        # Convert remaining harvested trees to victory points (2 trees -> 1 VP)
-        for player in self.players:
-            if player.harvested_trees > 0:
-                vp_gained = player.harvested_trees // 2
-                player.victory_points += vp_gained
-                player.total_vp_gained += vp_gained
-                player.harvested_trees = 0
-        # Hubbert Curve scenario (variant 2): apply penalty of -1 VP per extra woodcutter beyond the first
-        if self.variant == 2:
-            for player in self.players:
-                penalty = max(0, player.woodcutters - 1)
-                player.victory_points -= penalty
-        # Determine winner (or draw)
-        scores = [self.players[0].victory_points, self.players[1].victory_points]
-        if scores[0] > scores[1]:
-            winner = "Player 1"
-        elif scores[1] > scores[0]:
-            winner = "Player 2"
-        else:
-            winner = "Draw"
-        return scores, winner
+from models import GameModel, SCENARIO_NAMES, WOODCUTTER_COST, FOREST_MAX, LOG_LIMIT, LOG_PAGE, AMOUNT_ACTIONS, PLAYER_ACTIONS, ROUND_FIELDS, format_log_event
+from store import create_store
+from events import EventBroker
+from concurrency import cooperative
+from journal import GameJournal
+from archive import GameArchive, PLAYER_FIELDS, PLAYER_FILTERS
+from matchmaking import GameCodes, CODE_SPACE, queue_key
+from metrics import Registry, SamplingProfiler
+from fragments import FragmentCache
+from ratelimit import RateLimiter
+from dashboard import SessionDashboard
+from markupsafe import Markup
+import bot
 
 # Initialize Flask app
 app = Flask(__name__)
 app.secret_key = "CHANGE_THIS_SECRET_KEY"  # (Set a secure secret key via environment in production)
 
-# In-memory storage for active games: mapping game_id -> game state
-games = {}
+# Set JOURNAL_DIR to journal every game to disk, so a restarted worker picks its games back up
+journal = GameJournal(os.environ['JOURNAL_DIR']) if os.environ.get('JOURNAL_DIR') else None
+
+# Finished games are kept for research in this SQLite file (ARCHIVE_DB='' turns the archive off)
+ARCHIVE_DB = os.environ.get('ARCHIVE_DB', 'archive.db')
+archive = GameArchive(ARCHIVE_DB) if ARCHIVE_DB else None
+if archive is not None:
+    archive.start()
+
+def game_evicted(game_id, entry, reason):
+    """Called by the store for every game it drops."""
+    if journal is not None:
+        journal.discard(game_id)
+    fragments.invalidate(game_id)
+    dashboard.remove(game_id)
+
+# Running aggregates over this session's games for the instructors' dashboard
+dashboard = SessionDashboard(SCENARIO_NAMES)
+
+# Storage for active games: mapping game_id -> game state.
+# Set GAME_STORE=sqlite:///path/games.db to share games between several gunicorn workers.
+games = create_store(on_evict=game_evicted, on_archive=archive.add if archive is not None else None)
+# Keyed with a random secret (GAME_CODE_KEY, or one kept by the store), never the public default secret_key
+game_codes = GameCodes(os.environ.get('GAME_CODE_KEY') or games.code_key())
+if journal is not None:
+    for recovered_id, recovered_entry in journal.recover():
+        games.add(recovered_id, recovered_entry)
+        dashboard.update(recovered_id, recovered_entry)
+    journal.start()
+# Drop idle lobbies, abandoned games and (after a grace period for /download_log) finished games
+games.start_sweeper()
+
+# Board fragments (forest, players, log page) rendered once per game state
+fragments = FragmentCache()
+
+# Wakes /events streams when a game changes (turn handoff, Player 2 joining, game over)
+broker = EventBroker()
+if games.shared:
+    # Other workers cannot wake our streams directly: one poll per second finds their changes
+    broker.watch(games.last_touched)
+    # ... and they move on or evict games this worker's dashboard has records of
+    dashboard.start_sync(games.last_touched, games.get)
+STREAM_HEARTBEAT = 15      # seconds between keep-alive comments on an idle event stream
+STREAM_MAX_AGE = 300       # close streams after this long; EventSource reconnects on its own
+# Open /events streams per worker. Each holds its connection: a green thread under gevent, but one of the
+# THREADS threads with gthread workers, so there half of them stay free for everything else. Past the cap,
+# pages poll /game_status instead.
+MAX_STREAMS = int(os.environ.get('MAX_STREAMS', 1000 if cooperative() else int(os.environ.get('THREADS', 32)) // 2))
+MAX_TURN_ACTIONS = 50      # most actions accepted in one /api/turn request
+EXPORT_CHUNK = 64 * 1024   # bytes gathered before /export sends a piece of the stream
+
+# Token buckets per player seat and client address, so a stuck tab or a script cannot starve other games.
+# Polling and actions have separate budgets; RATE_LIMIT=off turns limiting off (e.g. for bench.py).
+app.config['RATE_LIMIT'] = os.environ.get('RATE_LIMIT', 'on') != 'off'
+RATE_LIMITS = {
+    'poll': RateLimiter(rate=4, burst=30),     # page reloads and status polls
+    'action': RateLimiter(rate=8, burst=40),   # game actions (a whole /api/turn counts once)
+}
+RATE_LIMITED_ENDPOINTS = {
+    'game_page': 'poll', 'waiting': 'poll', 'game_status': 'poll', 'game_state': 'poll', 'game_events': 'poll',
+    'hint': 'poll',
+    'action_harvest': 'action', 'action_replant': 'action', 'action_buy_vp': 'action', 'action_buy_wc': 'action',
+    'action_exchange': 'action', 'action_end_turn': 'action', 'api_turn': 'action',
+}
+BOT_SEAT = 1               # the computer plays Player 2 in single-player games
+BOT_INFO = {'name': "Computer", 'age': '', 'mobile': '', 'nationality': '', 'gender': '', 'education': ''}
+
+# Operator token for /metrics and the profiler (unset: /metrics is open and the profiler only runs in debug mode)
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+# Prometheus metrics of this worker process, served on /metrics
+metrics = Registry()
+REQUEST_SECONDS = metrics.histogram('http_request_duration_seconds', "Time to build each response, by endpoint.",
+                                    labels=('endpoint', 'method'))
+TEMPLATE_SECONDS = metrics.histogram('template_render_seconds', "Time spent in render_template, by template.",
+                                     labels=('template',))
+ACTION_SECONDS = metrics.histogram('game_action_seconds', "Time spent in the game rules (GameModel.act), by action.",
+                                   labels=('action',))
+ACTIONS = metrics.counter('game_actions_total', "Accepted player actions (harvests, replants, ...).", labels=('action',))
+ROUNDS_ENDED = metrics.counter('game_rounds_ended_total', "Rounds completed by both players.")
+GAMES_CREATED = metrics.counter('games_created_total', "Games opened (with /start, or a /play lobby left waiting).")
+GAMES_STARTED = metrics.counter('games_started_total', "Games started by Player 2 joining.")
+GAMES_FINISHED = metrics.counter('games_finished_total', "Games played to the end.")
+FRAGMENTS = metrics.counter('game_board_fragments_total', "Game board fragments served, by whether they were cached.",
+                            labels=('result',))
+metrics.gauge('games', "Games held in the store, by state.",
+              lambda: {(state,): count for state, count in games.stats().items() if state in ('lobby', 'active', 'finished')},
+              labels=('state',))
+# reason="lobby_ttl" and "idle_ttl" are the abandoned games
+metrics.gauge('games_evicted_total', "Games dropped from the store, by reason.",
+              lambda: {(reason,): count for reason, count in games.stats()['evicted'].items()},
+              labels=('reason',), kind='counter')
+metrics.gauge('event_streams_open', "Open /events streams.", broker.listener_count)
+STREAMS_REFUSED = metrics.counter('event_streams_refused_total', "/events streams turned away at MAX_STREAMS.")
+RATE_LIMITED = metrics.counter('rate_limited_requests_total', "Requests refused with 429 by the rate limiter, by budget.",
+                               labels=('budget',))
+metrics.gauge('rate_limit_buckets', "Clients tracked by the rate limiter, by budget.",
+              lambda: {(budget,): len(limiter) for budget, limiter in RATE_LIMITS.items()}, labels=('budget',))
+metrics.gauge('game_history_entries', "Log messages and round records held across all games.",
+              lambda: {(kind,): count for kind, count in games.history_totals().items()}, labels=('kind',))
+profiler = SamplingProfiler()
+
+# Solver tables for /hint (solver.py needs numpy, so it is imported on the first hint)
+_policy = None
+
+def hint_policy():
+    """The memory-mapped solver tables, or None when numpy or the tables (python solver.py) are missing."""
+    global _policy
+    if _policy is None:
+        try:
+            import solver
+        except ImportError:
+            return None
+        _policy = solver.Policy()
+    return _policy if _policy.available() else None
+
+def render_template(template_name, **context):
+    """flask.render_template, timed per template."""
+    with TEMPLATE_SECONDS.time(template_name):
+        return flask_render_template(template_name, **context)
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.before_request
+def rate_limit():
+    """Answer 429 with Retry-After when this seat (or address) has used up its budget for the endpoint."""
+    budget = RATE_LIMITED_ENDPOINTS.get(request.endpoint)
+    if budget is None or not app.config['RATE_LIMIT']:
+        return None
+    wait = RATE_LIMITS[budget].acquire((session.get('game_id'), session.get('player_index'), request.remote_addr))
+    if not wait:
+        return None
+    RATE_LIMITED.inc(budget)
+    response = jsonify(error="rate_limited", retry_after=round(wait, 2))
+    response.status_code = 429
+    response.headers['Retry-After'] = str(math.ceil(wait))
+    return response
+
+@app.teardown_request
+def record_request_time(exc=None):
+    start = g.pop('request_start', None)
+    if start is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - start, request.endpoint or 'unmatched', request.method)
+
+def admin_authorized():
+    """True if the request carries ADMIN_TOKEN (as a Bearer token or ?token=), or no token is configured in debug mode."""
+    if not ADMIN_TOKEN:
+        return app.debug
+    supplied = request.args.get('token', '')
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        supplied = header[len('Bearer '):]
+    return hmac.compare_digest(supplied.encode(), ADMIN_TOKEN.encode())
+
+def record_progress(model, actions, round_before, over_before):
+    """Count accepted (action, amount) pairs plus any round or game they completed."""
+    for action, _ in actions:
+        ACTIONS.inc(action)
+    if model.current_round > round_before:
+        ROUNDS_ENDED.inc(amount=model.current_round - round_before)
+    if model.game_over and not over_before:
+        GAMES_FINISHED.inc()
+
+def actions_applied(game_id, game, player_idx, actions, round_before, over_before):
+    """Bookkeeping once `actions` ((action, amount) pairs) are applied to game['model']:
+    counters, the dashboard, the journal and, in single-player games, the computer's reply."""
+    model = game['model']
+    fragments.invalidate(game_id)
+    record_progress(model, actions, round_before, over_before)
+    dashboard.update(game_id, game)
+    if journal is not None:
+        journal.record(game_id, game, player_idx, actions, round_before)
+    if archive is not None and model.game_over and not over_before:
+        archive.add(game_id, game)
+    if game.get('bot') and not model.game_over and model.current_player == BOT_SEAT:
+        round_before, over_before = model.current_round, model.game_over
+        with ACTION_SECONDS.time('bot_turn'):
+            played = bot.play_turn(model, BOT_SEAT)
+        actions_applied(game_id, game, BOT_SEAT, played, round_before, over_before)
 
 def generate_game_id():
-    """Generate a unique 6-character game code."""
-    import string
-    chars = string.ascii_uppercase + string.digits
-    while True:
-        code = ''.join(random.choice(chars) for _ in range(6))
-        if code not in games:
-            return code
+    """Next 6-character game code from the collision-free allocator (see matchmaking.GameCodes)."""
+    return game_codes.number_to_code(games.next_number() % CODE_SPACE)
+
+def player_info_from_form():
+    # Player information as entered on the start / join / play forms
+    return {field: request.form.get(field, '') for field in PLAYER_FIELDS}
+
+def variant_from_form():
+    try:
+        variant = int(request.form.get('variant', '1'))
+    except:
+        variant = 1
+    return variant if variant in (1, 2, 3) else 1
+
+def add_game(entry):
+    """Store a new game entry under a fresh code and return the code."""
+    game_id = generate_game_id()
+    while not games.add(game_id, entry):   # only if the code is still held by a game from an earlier counter
+        game_id = generate_game_id()
+    if journal is not None:
+        journal.snapshot(game_id, entry)
+    dashboard.update(game_id, entry)
+    return game_id
+
+def seat_player_two(game_id, game, p2_info):
+    """Seat Player 2 in a lobby and start the game (call inside games.transaction(game_id))."""
+    game['p2_info'] = p2_info
+    # Initialize the game model with both players' info and chosen variant
+    game['model'] = GameModel(game['variant'], [game['p1_info'], p2_info])
+    if journal is not None:
+        journal.snapshot(game_id, game)
+    dashboard.update(game_id, game)
 
 @app.route('/')
 def index():
@@ -181,32 +247,30 @@ def index():
 def start_game():
     if request.method == 'POST':
         # Collect Player 1's information from the form
-        p1_info = {
-            'name': request.form.get('name', ''),
-            'age': request.form.get('age', ''),
-            'mobile': request.form.get('mobile', ''),
-            'nationality': request.form.get('nationality', ''),
-            'gender': request.form.get('gender', ''),
-            'education': request.form.get('education', '')
-        }
+        p1_info = player_info_from_form()
         # Game variant (scenario) selection
-        try:
-            variant = int(request.form.get('variant', '1'))
-        except:
-            variant = 1
-        if variant not in (1, 2, 3):
-            variant = 1
+        variant = variant_from_form()
+        single_player = request.form.get('opponent') == 'computer'
         # Create a new game entry
-        game_id = generate_game_id()
-        games[game_id] = {
+        entry = {
             'p1_info': p1_info,
             'p2_info': None,
             'variant': variant,
             'model': None   # GameModel will be created once second player joins
         }
+        if single_player:
+            # The computer takes Player 2's seat right away
+            entry['p2_info'] = dict(BOT_INFO)
+            entry['model'] = GameModel(variant, [p1_info, entry['p2_info']])
+            entry['bot'] = True
+        game_id = add_game(entry)
+        GAMES_CREATED.inc()
         # Set session to identify this user as Player 1 of the new game
         session['game_id'] = game_id
         session['player_index'] = 0
+        if single_player:
+            GAMES_STARTED.inc()
+            return redirect(url_for('game_page'))
         return redirect(url_for('waiting', game_id=game_id))
     # GET: render the start game form
     return render_template('start.html')
@@ -214,24 +278,26 @@ def start_game():
 @app.route('/wait/<game_id>')
 def waiting(game_id):
     # Waiting page for Player 1, while Player 2 has not joined yet
-    if 'game_id' not in session or session.get('game_id') != game_id or session.get('player_index') != 0:
+    game = games.get(game_id)
+    if not game or 'game_id' not in session or session.get('game_id') != game_id or session.get('player_index') != 0:
         # If a Player 2 somehow accesses this page and the game is ready, redirect to the game
-        if game_id in games and games[game_id]['model']:
+        if game and game['model']:
             return redirect(url_for('game_page'))
         flash("Unauthorized or invalid game access.")
         return redirect(url_for('index'))
-    scenario_name = SCENARIO_NAMES.get(games[game_id]['variant'], '')
-    return render_template('waiting.html', game_id=game_id, scenario=scenario_name)
+    scenario_name = SCENARIO_NAMES.get(game['variant'], '')
+    return render_template('waiting.html', game_id=game_id, scenario=scenario_name, room=game.get('room'))
 
 @app.route('/join', methods=['GET', 'POST'])
 def join_game():
     if request.method == 'POST':
         # Player 2 enters a game code to join
         code = request.form.get('game_code', '').strip()
-        if not code or code not in games:
+        game = games.get(code) if code else None
+        if not game:
             flash("Invalid game code. Please try again.")
             return redirect(url_for('join_game'))
-        if games[code]['p2_info'] is not None:
+        if game['p2_info'] is not None:
             flash("That game already has two players or has started.")
             return redirect(url_for('join_game'))
         # If code is valid and game is open, redirect to player info form for joining
@@ -241,34 +307,65 @@ def join_game():
 
 @app.route('/join/<game_id>', methods=['GET', 'POST'])
 def join_game_with_code(game_id):
-    game = games.get(game_id)
-    if not game:
-        flash("Invalid game code.")
-        return redirect(url_for('join_game'))
-    if game['p2_info'] is not None:
-        flash("This game already has two players.")
-        return redirect(url_for('join_game'))
+    # Hold the game's lock so two people submitting the join form cannot both become Player 2
+    with games.transaction(game_id) as game:
+        if not game:
+            flash("Invalid game code.")
+            return redirect(url_for('join_game'))
+        if game['p2_info'] is not None:
+            flash("This game already has two players.")
+            return redirect(url_for('join_game'))
+        if request.method == 'POST':
+            # Collect Player 2's information and start the game
+            seat_player_two(game_id, game, player_info_from_form())
+            # Mark this session as Player 2 in the game
+            session['game_id'] = game_id
+            session['player_index'] = 1
+        else:
+            # GET: render Player 2 info form, showing scenario name for context
+            scenario_name = SCENARIO_NAMES.get(game['variant'], '')
+            return render_template('join.html', game_id=game_id, scenario=scenario_name)
+    GAMES_STARTED.inc()
+    # Wake Player 1's waiting page (only after the store has saved the new model)
+    broker.publish(game_id)
+    return redirect(url_for('game_page'))
+
+@app.route('/play', methods=['GET', 'POST'])
+def matchmaking():
+    # Classroom lobby: players with the same room code and scenario are paired in arrival order
     if request.method == 'POST':
-        # Collect Player 2's information
-        p2_info = {
-            'name': request.form.get('name', ''),
-            'age': request.form.get('age', ''),
-            'mobile': request.form.get('mobile', ''),
-            'nationality': request.form.get('nationality', ''),
-            'gender': request.form.get('gender', ''),
-            'education': request.form.get('education', '')
-        }
-        game['p2_info'] = p2_info
-        # Initialize the game model with both players' info and chosen variant
-        variant = game['variant']
-        game['model'] = GameModel(variant, [game['p1_info'], game['p2_info']])
-        # Mark this session as Player 2 in the game
-        session['game_id'] = game_id
+        info = player_info_from_form()
+        variant = variant_from_form()
+        room = request.form.get('room', '')[:32]
+        # Open our own lobby first, so a player who finds nobody waiting is already a joinable game
+        game_id = add_game({'p1_info': info, 'p2_info': None, 'variant': variant, 'model': None,
+                            'room': room.strip().upper()})
+        queue = queue_key(room, variant)
+        while True:
+            other = games.match_waiting(queue, game_id)
+            if other is None:
+                # Nobody waiting: wait for the next player in this queue (or anyone given the code)
+                GAMES_CREATED.inc()   # only now: a lobby dropped on a match was never a game of its own
+                session['game_id'] = game_id
+                session['player_index'] = 0
+                return redirect(url_for('waiting', game_id=game_id))
+            with games.transaction(other) as game:
+                joined = bool(game) and game['p2_info'] is None   # someone may have joined it by code meanwhile
+                if joined:
+                    seat_player_two(other, game, info)
+            if joined:
+                break
+        # Paired with a waiting player: drop our own lobby and take Player 2's seat in theirs
+        games.delete(game_id)
+        if journal is not None:
+            journal.discard(game_id)
+        dashboard.remove(game_id)
+        session['game_id'] = other
         session['player_index'] = 1
+        GAMES_STARTED.inc()
+        broker.publish(other)
         return redirect(url_for('game_page'))
-    # GET: render Player 2 info form, showing scenario name for context
-    scenario_name = SCENARIO_NAMES.get(game['variant'], '')
-    return render_template('join.html', game_id=game_id, scenario=scenario_name)
+    return render_template('play.html')
 
 @app.route('/game')
 def game_page():
@@ -297,181 +394,303 @@ def game_page():
     # If game is ongoing, prepare data for rendering the game board
     current_idx = model.current_player         # index (0 or 1) of the player whose turn it is
     current_player = model.players[current_idx]
-    # Calculate maximum allowed values for replant/buy actions for convenience
-    max_replant = current_player.harvested_trees // 1 if current_player.has_harvested else 0
-    # (Above: effectively min(current_player.harvested_trees, floor((100 - forest - buffer)/3)), simplified for template use)
-    max_replant = min(current_player.harvested_trees, (100 - model.forest - model.replant_buffer) // 3) if current_player.has_harvested else 0
-    max_buy_vp = current_player.harvested_trees // 2 if current_player.has_harvested else 0
-    max_buy_wc = current_player.harvested_trees // WOODCUTTER_COST if current_player.has_harvested else 0
-    log_list = model.log_messages
+    # Maximum allowed values for replant/buy actions, for the inputs' max attributes
+    replant_room = (FOREST_MAX - model.forest - model.replant_buffer) // 3   # most trees the forest has room to replant
+    if current_player.has_harvested:
+        max_replant = min(current_player.harvested_trees, replant_room)
+        max_buy_vp = current_player.harvested_trees // 2
+        max_buy_wc = current_player.harvested_trees // WOODCUTTER_COST
+    else:
+        max_replant = max_buy_vp = max_buy_wc = 0
+    # Forest, player and log panels are the same for both players: render them once per game state
+    state = (model.seed, model.version)
+    def fragment(name, template, context):
+        html = fragments.get(game_id, state, name)
+        FRAGMENTS.inc('miss' if html is None else 'hit')
+        if html is None:
+            html = Markup(render_template(template, **context()))
+            fragments.put(game_id, state, name, html)
+        return html
+    forest_html = fragment('forest', '_forest.html', lambda: {'model': model})
+    players_html = fragment('players', '_players.html', lambda: {
+        'p1': game['p1_info'], 'p2': game['p2_info'], 'player1': model.players[0], 'player2': model.players[1],
+        'current_index': current_idx})
+    # Only one page of the log is formatted, however long the game has run (pages past the end show the oldest)
+    page = min(max(request.args.get('log_page', 0, type=int), 0), LOG_LIMIT // LOG_PAGE)
+    def log_context():
+        log, log_page, log_pages = model.log_page(page)
+        return {'log': log, 'log_page': log_page, 'log_pages': log_pages}
+    log_html = fragment(f'log:{page}', '_log.html', log_context)
     scenario = SCENARIO_NAMES.get(game['variant'], '')
     # Pass all relevant state to the template
-    return render_template('game.html', game_id=game_id, p1=game['p1_info'], p2=game['p2_info'], model=model,
-                           player1=model.players[0], player2=model.players[1],
+    return render_template('game.html', game_id=game_id, model=model, forest_html=forest_html,
+                           players_html=players_html, log_html=log_html,
                            current_index=current_idx, current_player=current_player,
                            player_index=player_idx, my_status=model.players[player_idx],
                            max_replant=max_replant, max_buy_vp=max_buy_vp, max_buy_wc=max_buy_wc,
-                           log=log_list, scenario=scenario)
+                           replant_room=replant_room, woodcutter_cost=WOODCUTTER_COST, scenario=scenario)
 
 @app.route('/game_status/<game_id>')
 def game_status(game_id):
-    # A small endpoint to check if the game is ready (used by waiting page to poll for readiness)
+    # Small polling endpoint: readiness for the waiting page, plus current turn and game-over flag once started
+    status = game_status_payload(games.get(game_id))
+    if status is None:
+        return jsonify(error="not_found"), 404
+    return jsonify(status)
+
+def game_status_payload(game):
+    """The state clients watch for: readiness, whose turn it is, and whether the game is over."""
+    if not game:
+        return None
+    model = game['model']
+    if model is None:
+        return {'status': "waiting"}
+    return {'status': "ready", 'current_player': model.current_player, 'game_over': model.game_over}
+
+@app.route('/state/<game_id>')
+def game_state(game_id):
+    """Versioned board state for polling or reconnecting clients.
+
+    Sends an ETag per state version and answers a matching If-None-Match with 304.
+    With ?since=<version> only the fields changed and log messages added after that
+    version are returned; otherwise the full snapshot and log. Clients should send
+    the `seed` of the response they hold too (?since=<version>&seed=<seed>), so a
+    version from an earlier game under the same code gets a full snapshot.
+    """
     game = games.get(game_id)
-    if game and game['model']:
-        return jsonify(status="ready")
+    if not game:
+        return jsonify(error="not_found"), 404
+    model = game['model']
+    if model is None:
+        etag = f"{game_id}-lobby"
+        payload = {'status': "waiting"}
     else:
-        return jsonify(status="waiting")
+        # The seed tells apart two games that reused the same code
+        etag = f"{game_id}-{model.seed}-{model.version}"
+        since = request.args.get('since', type=int)
+        # A version from another game under the same code (a different ?seed=, or a version this game
+        # has not reached) says nothing about this game: send the full snapshot
+        seed = request.args.get('seed', str(model.seed))
+        if since is not None and (since > model.version or seed != str(model.seed)):
+            since = None
+        if since is None:
+            payload = {'status': "ready", 'version': model.version, 'state': model.snapshot(),
+                       'log': model.log_messages}
+        elif since < model.version:
+            changes, log, truncated = model.changes_since(since)
+            payload = {'status': "ready", 'version': model.version, 'since': since, 'changes': changes,
+                       'log': log, 'log_truncated': truncated}
+        else:
+            # The client is already up to date
+            payload = {'status': "ready", 'version': model.version, 'since': since, 'changes': {}, 'log': []}
+        payload['seed'] = str(model.seed)   # a string: 64-bit seeds do not fit a JavaScript number
+    if etag in request.if_none_match:
+        return '', 304, {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+    response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/events/<game_id>')
+def game_events(game_id):
+    # Server-Sent Events stream: pushes the game_status payload whenever it changes
+    if games.get(game_id) is None:
+        return jsonify(error="not_found"), 404
+    if broker.listener_count() >= MAX_STREAMS:
+        # EventSource does not reconnect after an error status; the pages then poll /game_status
+        STREAMS_REFUSED.inc()
+        return jsonify(error="too_many_streams"), 503, {'Retry-After': '30'}
+    def stream():
+        last_status = None
+        waited = 0
+        with broker.subscribe(game_id) as sub:
+            yield "retry: 2000\n\n"
+            while waited < STREAM_MAX_AGE:
+                seq = sub.seq   # read before the state so a publish in between is not missed
+                status = game_status_payload(games.get(game_id)) or {'error': "not_found"}   # evicted
+                if status != last_status:
+                    yield f"data: {json.dumps(status)}\n\n"
+                    last_status = status
+                if 'error' in status or status.get('game_over'):
+                    return
+                if not sub.wait(seq, STREAM_HEARTBEAT):
+                    waited += STREAM_HEARTBEAT
+                    yield ": keep-alive\n\n"
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 # --- Game action endpoints (triggered by form submissions on the game page) ---
 
-@app.route('/harvest', methods=['POST'])
-def action_harvest():
+def perform_form_action(action):
+    """Apply one action from a game page form for the session's player, then go back to the board."""
     if 'game_id' not in session:
         return redirect(url_for('index'))
-    game = games.get(session['game_id'])
-    if not game or not game['model']:
-        return redirect(url_for('index'))
-    model = game['model']
-    player_idx = session['player_index']
-    # Only allow if it's this player's turn
-    if player_idx != model.current_player:
-        flash("Not your turn.")
-        return redirect(url_for('game_page'))
-    # Perform harvest action
-    harvested = model.harvest()
-    model.log_messages.append(f"Player {player_idx+1} harvested {harvested} trees (Total harvested: {model.players[player_idx].harvested_trees})")
-    # If harvest depleted the forest, end game immediately
-    if model.forest <= 0:
-        # Apply final scoring rules and mark game over
-        model.end_game()
-        model.game_over = True
-        model.log_messages.append("Forest depleted! Game over.")
-        model.log_messages.append(f"Final Scores -> Player 1: {model.players[0].victory_points}, Player 2: {model.players[1].victory_points}")
-        if model.variant == 2:
-            model.log_messages.append("Hubbert variant: woodcutter penalty applied to final scores.")
+    with games.transaction(session['game_id']) as game:
+        if not game or not game['model']:
+            return redirect(url_for('index'))
+        amount = 0
+        if action in AMOUNT_ACTIONS:
+            try:
+                amount = int(request.form.get('amount', '0'))
+            except:
+                amount = 0
+        model = game['model']
+        round_before, over_before = model.current_round, model.game_over
+        with ACTION_SECONDS.time(action):
+            error = model.act(session['player_index'], action, amount)
+        if error:
+            flash(error)
+            return redirect(url_for('game_page'))
+        actions_applied(session['game_id'], game, session['player_index'], [(action, amount)], round_before, over_before)
+    # Push the change to the other player's open page (turn handoff, depleted forest, ...)
+    broker.publish(session['game_id'])
     return redirect(url_for('game_page'))
 
+@app.route('/harvest', methods=['POST'])
+def action_harvest():
+    return perform_form_action('harvest')
+
 @app.route('/replant', methods=['POST'])
 def action_replant():
-    if 'game_id' not in session:
-        return redirect(url_for('index'))
-    game = games.get(session['game_id'])
-    if not game or not game['model']:
-        return redirect(url_for('index'))
-    model = game['model']
-    player_idx = session['player_index']
-    # Only allow if it's this player's turn and they have harvested already this turn
-    if player_idx != model.current_player or not model.players[player_idx].has_harvested:
-        flash("Action not allowed.")
-        return redirect(url_for('game_page'))
-    # Get the requested amount to replant
-    try:
-        amount = int(request.form.get('amount', '0'))
-    except:
-        amount = 0
-    # Perform replant action
-    if model.replant(amount):
-        model.log_messages.append(f"Scheduled to replant {amount} tree(s) (+{amount*3} trees next round)")
-    else:
-        flash("Invalid replant amount.")
-    return redirect(url_for('game_page'))
+    return perform_form_action('replant')
 
 @app.route('/buy_vp', methods=['POST'])
 def action_buy_vp():
-    if 'game_id' not in session:
-        return redirect(url_for('index'))
-    game = games.get(session['game_id'])
-    if not game or not game['model']:
-        return redirect(url_for('index'))
-    model = game['model']
-    player_idx = session['player_index']
-    if player_idx != model.current_player or not model.players[player_idx].has_harvested:
-        flash("Action not allowed.")
-        return redirect(url_for('game_page'))
-    try:
-        amount = int(request.form.get('amount', '0'))
-    except:
-        amount = 0
-    if model.buy_vp(amount):
-        model.log_messages.append(f"Bought {amount} Victory Point(s)")
-    else:
-        flash("Invalid amount for buying VP.")
-    return redirect(url_for('game_page'))
+    return perform_form_action('buy_vp')
 
 @app.route('/buy_wc', methods=['POST'])
 def action_buy_wc():
-    if 'game_id' not in session:
-        return redirect(url_for('index'))
-    game = games.get(session['game_id'])
-    if not game or not game['model']:
-        return redirect(url_for('index'))
-    model = game['model']
-    player_idx = session['player_index']
-    if player_idx != model.current_player or not model.players[player_idx].has_harvested:
-        flash("Action not allowed.")
-        return redirect(url_for('game_page'))
-    try:
-        amount = int(request.form.get('amount', '0'))
-    except:
-        amount = 0
-    if model.buy_wc(amount):
-        model.log_messages.append(f"Bought {amount} Woodcutter(s)")
-    else:
-        flash("Invalid amount for buying woodcutters.")
-    return redirect(url_for('game_page'))
+    return perform_form_action('buy_wc')
 
 @app.route('/exchange', methods=['POST'])
 def action_exchange():
-    if 'game_id' not in session:
-        return redirect(url_for('index'))
-    game = games.get(session['game_id'])
-    if not game or not game['model']:
-        return redirect(url_for('index'))
-    model = game['model']
-    player_idx = session['player_index']
-    if player_idx != model.current_player or not model.players[player_idx].has_harvested:
-        flash("Action not allowed.")
-        return redirect(url_for('game_page'))
-    result = model.exchange_wc()
-    if result == "exchanged":
-        model.log_messages.append(f"Exchanged 1 Woodcutter for {EXCHANGE_VALUE} VP (Exchanges this round: {model.players[player_idx].exchanges_this_round})")
-    elif result == "limit":
-        flash("You can only exchange 2 woodcutters per round.")
-    elif result == "min_wc":
-        flash("You must keep at least 1 woodcutter.")
-    return redirect(url_for('game_page'))
+    return perform_form_action('exchange')
 
 @app.route('/end_turn', methods=['POST'])
 def action_end_turn():
-    if 'game_id' not in session:
-        return redirect(url_for('index'))
+    return perform_form_action('end_turn')
+
+@app.route('/api/turn', methods=['POST'])
+def api_turn():
+    """Apply a list of actions for the session's player in one request, all or nothing.
+
+    Body: {"actions": [{"action": "harvest"}, {"action": "buy_vp", "amount": 2}, {"action": "end_turn"}]}
+    Returns the board fields that changed and the new log messages, or the first refused action.
+    """
+    if 'game_id' not in session or 'player_index' not in session:
+        return jsonify(error="You are not in an active game."), 401
+    payload = request.get_json(silent=True)
+    actions = payload.get('actions') if isinstance(payload, dict) else None
+    if not isinstance(actions, list) or not actions or len(actions) > MAX_TURN_ACTIONS:
+        return jsonify(error=f"Expected 'actions': a list of 1 to {MAX_TURN_ACTIONS} actions."), 400
+    with games.transaction(session['game_id']) as game:
+        if not game or not game['model']:
+            return jsonify(error="Game is not ready yet."), 404
+        before = game['model'].snapshot()
+        # Work on a copy and only keep it if every action is accepted
+        model = game['model'].copy()
+        for index, item in enumerate(actions):
+            action = item.get('action') if isinstance(item, dict) else None
+            amount = item.get('amount', 0) if isinstance(item, dict) else 0
+            if not isinstance(amount, int) or isinstance(amount, bool):
+                error = "Amount must be a whole number."
+            else:
+                with ACTION_SECONDS.time(action if action in PLAYER_ACTIONS else 'invalid'):
+                    error = model.act(session['player_index'], action, amount)
+            if error:
+                return jsonify(error=error, index=index), 409
+        round_before, over_before = game['model'].current_round, game['model'].game_over
+        game['model'] = model
+        actions_applied(session['game_id'], game, session['player_index'],
+                        [(item['action'], item.get('amount', 0)) for item in actions], round_before, over_before)
+        after = model.snapshot()
+        new_log = after['log_length'] - before['log_length']
+        response = jsonify(version=model.version, changes={key: value for key, value in after.items() if before[key] != value},
+                           log=[format_log_event(event) for event in model.log_events[-new_log:]] if new_log else [])
+    broker.publish(session['game_id'])
+    return response
+
+@app.route('/hint')
+def hint():
+    """Best way to spend this turn's harvest, from the offline solver.
+
+    With ?buy_wc=&replant=&exchange= also returns `regret`: the expected points that plan gives up
+    against the best one (leftover trees are assumed to be banked as victory points).
+    """
+    if 'game_id' not in session or 'player_index' not in session:
+        return jsonify(error="You are not in an active game."), 401
     game = games.get(session['game_id'])
     if not game or not game['model']:
-        return redirect(url_for('index'))
-    model = game['model']
-    player_idx = session['player_index']
-    # Only allow end turn if it's this player's turn and they have harvested
-    if player_idx != model.current_player or not model.players[player_idx].has_harvested:
-        flash("Cannot end turn before harvesting.")
-        return redirect(url_for('game_page'))
-    # End this player's turn
-    model.players[player_idx].has_harvested = False
-    # Switch active player (0 -> 1 or 1 -> 0)
-    model.current_player = 1 - model.current_player
-    # If we've moved back to Player 1, that means a full round is completed
-    if model.current_player == 0:
-        model.current_round += 1
-        model.end_round()
-        model.log_messages.append(f"=== End of Round {model.current_round} ===")
-        model.log_messages.append(f"Forest now has {model.forest} trees")
-        # If the game ended due to round limit or forest depletion at this point
-        if model.game_over:
-            model.end_game()
-            model.log_messages.append("Game reached final round or forest is depleted. Game over.")
-            model.log_messages.append(f"Final Scores -> Player 1: {model.players[0].victory_points}, Player 2: {model.players[1].victory_points}")
-            if model.variant == 2:
-                model.log_messages.append("Hubbert variant: woodcutter penalty applied to final scores.")
-    return redirect(url_for('game_page'))
+        return jsonify(error="Game is not ready yet."), 404
+    model, player_idx = game['model'], session['player_index']
+    if model.game_over or model.current_player != player_idx or not model.players[player_idx].has_harvested:
+        return jsonify(error="Hints are given on your turn, after harvesting."), 409
+    policy = hint_policy()
+    if policy is None:
+        return jsonify(error="Hints are not available on this server."), 503
+    plan = None
+    if any(key in request.args for key in ('buy_wc', 'replant', 'exchange')):
+        plan = tuple(request.args.get(key, 0, type=int) for key in ('buy_wc', 'replant', 'exchange'))
+    return jsonify(policy.hint(model, player_idx, plan))
+
+def archive_time(value):
+    """Epoch seconds from an epoch number or an ISO date/time (YYYY-MM-DD[THH:MM])."""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+def archive_filters():
+    """Archive filters from the query string (see GameArchive.query)."""
+    filters = {'variant': request.args.get('variant', type=int),
+               'since': request.args.get('since', type=archive_time), 'until': request.args.get('until', type=archive_time),
+               'age_min': request.args.get('age_min', type=int), 'age_max': request.args.get('age_max', type=int)}
+    filters.update({field: request.args.get(field) for field in PLAYER_FILTERS})
+    return filters
+
+@app.route('/archive/games')
+def archive_games():
+    """Finished games from the research archive, newest first (operators only).
+
+    Filters: variant, since/until (epoch seconds or ISO dates), age_min/age_max, nationality, gender, education.
+    Paging: limit (at most 1000) and offset. rounds=1 adds each game's per-round records as round_stats.
+    """
+    if archive is None or not admin_authorized():
+        abort(404)
+    filters = archive_filters()
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+    found = archive.query(limit=limit, offset=max(request.args.get('offset', 0, type=int), 0), **filters)
+    if request.args.get('rounds') == '1':
+        for game in found:
+            game['round_stats'] = archive.rounds(game['id'])
+    return jsonify(total=archive.count(**filters), games=found)
+
+# Columns of the per-round rows in the CSV log (values in models.ROUND_FIELDS order)
+LOG_HEADERS = ["Round", "Trees Remaining", "P1 Replanted", "P2 Replanted",
+               "P1 Harvested", "P1 Woodcutters", "P1 Victory Points",
+               "P2 Harvested", "P2 Woodcutters", "P2 Victory Points"]
+
+def game_log_rows(p1_info, p2_info, comment, seed, rounds):
+    """Rows of one game's CSV log: player information, comment, seed, then one row per round."""
+    # Player 1 info
+    yield ["Player 1 Information"]
+    for key, value in p1_info.items():
+        yield [key.capitalize(), value]
+    yield []
+    # Player 2 info
+    yield ["Player 2 Information"]
+    for key, value in p2_info.items():
+        yield [key.capitalize(), value]
+    yield []
+    # Comments
+    yield ["Comment", comment]
+    yield ["Seed", seed]   # GameModel(variant, info, seed=...) replays this game's harvests
+    yield []
+    # Game data headers
+    yield LOG_HEADERS
+    # Game data per round (each record is already in header order, see models.ROUND_FIELDS)
+    yield from rounds
 
 @app.route('/download_log', methods=['POST'])
 def download_log():
@@ -485,42 +704,12 @@ def download_log():
         return redirect(url_for('index'))
     model = game['model']
     comment = request.form.get('comment', '').strip()  # feedback comment from players
+    if comment and archive is not None:
+        archive.set_comment(game_id, model.seed, comment)
     # Prepare CSV data in memory
     output = io.StringIO()
     writer = csv.writer(output)
-    # Player 1 info
-    writer.writerow(["Player 1 Information"])
-    for key, value in game['p1_info'].items():
-        writer.writerow([key.capitalize(), value])
-    writer.writerow([])
-    # Player 2 info
-    writer.writerow(["Player 2 Information"])
-    for key, value in game['p2_info'].items():
-        writer.writerow([key.capitalize(), value])
-    writer.writerow([])
-    # Comments
-    writer.writerow(["Comment", comment])
-    writer.writerow([])
-    # Game data headers
-    headers = ["Round", "Trees Remaining", "P1 Replanted", "P2 Replanted",
-               "P1 Harvested", "P1 Woodcutters", "P1 Victory Points",
-               "P2 Harvested", "P2 Woodcutters", "P2 Victory Points"]
-    writer.writerow(headers)
-    # Game data per round
-    for stats in model.round_stats:
-        row = [
-            stats['round'],
-            stats['trees'],
-            stats['p1_replanted'],
-            stats['p2_replanted'],
-            stats['p1_harvested'],
-            stats['p1_woodcutters'],
-            stats['p1_vp'],
-            stats['p2_harvested'],
-            stats['p2_woodcutters'],
-            stats['p2_vp']
-        ]
-        writer.writerow(row)
+    writer.writerows(game_log_rows(game['p1_info'], game['p2_info'], comment, model.seed, model.round_stats))
     csv_data = output.getvalue()
     output.close()
     # Send CSV file as an attachment
@@ -529,18 +718,93 @@ def download_log():
     response.headers["Content-Disposition"] = f"attachment; filename={filename}"
     response.headers["Content-Type"] = "text/csv"
     return response
-    
-from flask import jsonify
-
-@app.route('/game_status/<code>')
-def game_status(code):
-    """Return current turn and game‑over flag as JSON."""
-    entry = games.get(code)
-    if not entry or entry['model'] is None:
-        return jsonify(error="not_found"), 404
-    m = entry['model']
-    return jsonify(current_player=m.current_player, game_over=m.game_over)
 
+@app.route('/metrics')
+def metrics_page():
+    """Prometheus text exposition of this worker's metrics."""
+    if ADMIN_TOKEN and not admin_authorized():
+        abort(403)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/dashboard')
+def dashboard_page():
+    """Live overview of the session's games for instructors (needs ADMIN_TOKEN, or debug mode)."""
+    if not admin_authorized():
+        abort(404)
+    return render_template('dashboard.html', token=request.args.get('token', ''))
+
+@app.route('/dashboard/data')
+def dashboard_data():
+    """The running session aggregates; the cost does not depend on how many games there are."""
+    if not admin_authorized():
+        abort(404)
+    return jsonify(dashboard.snapshot())
+
+@app.route('/metrics/profile', methods=['GET', 'POST'])
+def metrics_profile():
+    """Sampling profiler for this worker: POST action=start (optional interval in seconds) or action=stop,
+    GET the collapsed stacks recorded so far (flamegraph.pl / speedscope input)."""
+    if not admin_authorized():
+        abort(404)
+    if request.method == 'POST':
+        action = request.values.get('action')
+        if action == 'start':
+            interval = min(max(request.values.get('interval', 0.005, type=float), 0.001), 1.0)
+            changed = profiler.start(interval)
+        elif action == 'stop':
+            changed = profiler.stop()
+        else:
+            return jsonify(error="Expected action=start or action=stop."), 400
+        return jsonify(running=profiler.running, changed=changed, samples=profiler.samples)
+    return Response(profiler.report(request.args.get('limit', 200, type=int)), mimetype='text/plain')
+
+@app.route('/export')
+def export_games():
+    """Stream archived games as CSV (the /download_log layout per game) or NDJSON (one game per line).
+
+    Takes the /archive/games filters (variant, since/until, ...) and format=csv|ndjson.
+    Rows are produced while the response is sent, so memory use does not depend on the number of games.
+    """
+    if archive is None or not admin_authorized():
+        abort(404)
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify(error="format must be csv or ndjson"), 400
+    filters = archive_filters()
+
+    def csv_chunks():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for game in archive.iter_games(**filters):
+            p1_info, p2_info = game['players'] if len(game['players']) == 2 else ({}, {})
+            writer.writerow(["Game", game['game_id'], SCENARIO_NAMES.get(game['variant'], ''),
+                             datetime.fromtimestamp(game['finished_at']).isoformat(timespec='seconds')])
+            writer.writerows(game_log_rows(p1_info, p2_info, game['comment'] or '', game['seed'], game['round_stats']))
+            writer.writerow([])
+            if buffer.tell() >= EXPORT_CHUNK:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    def ndjson_chunks():
+        lines, size = [], 0
+        for game in archive.iter_games(**filters):
+            record = {key: game[key] for key in ('game_id', 'seed', 'variant', 'finished_at', 'comment', 'rounds',
+                                                'final_forest', 'p1_score', 'p2_score', 'single_player')}
+            record['players'] = game['players']
+            record['round_stats'] = [dict(zip(ROUND_FIELDS, values)) for values in game['round_stats']]
+            lines.append(json.dumps(record, separators=(',', ':')) + '\n')
+            size += len(lines[-1])
+            if size >= EXPORT_CHUNK:
+                yield ''.join(lines)
+                lines, size = [], 0
+        yield ''.join(lines)
+
+    filename = f"games_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+    chunks = csv_chunks() if fmt == 'csv' else ndjson_chunks()
+    return Response(stream_with_context(chunks), mimetype='text/csv' if fmt == 'csv' else 'application/x-ndjson',
+                    headers={'Content-Disposition': f"attachment; filename={filename}"})
 
 # If running this app.py directly (e.g., for local testing), start the Flask development server
 if __name__ == '__main__':
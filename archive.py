@@ -0,0 +1,246 @@
+"""SQLite archive of finished games for research queries.
+
+Every finished game is written once: both players' information, the variant,
+the final scores, one row per round (the `round_stats` records, ROUND_FIELDS
+columns) and, when a player downloads the log, their comment. A game is
+identified by its code plus its seed, since codes are reused.
+
+Requests never wait on the archive: `add` and `set_comment` only queue the
+work, and a background thread writes the queue in batches, one transaction
+per batch.
+
+    archive = GameArchive('archive.db')
+    archive.start()
+    archive.query(variant=2, since=time.time() - 86400, gender='female', limit=100)
+"""
+import atexit, logging, queue, sqlite3, threading, time
+
+from models import ROUND_FIELDS
+from concurrency import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# Player information kept per player, as entered on the start / join forms
+PLAYER_FIELDS = ('name', 'age', 'mobile', 'nationality', 'gender', 'education')
+# Filters on player information accepted by `query` (a game matches if either player matches)
+PLAYER_FILTERS = ('nationality', 'gender', 'education')
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS games (
+        id INTEGER PRIMARY KEY, game_id TEXT NOT NULL, seed TEXT NOT NULL, variant INTEGER NOT NULL,
+        finished_at REAL NOT NULL, rounds INTEGER NOT NULL, final_forest INTEGER NOT NULL,
+        p1_score INTEGER NOT NULL, p2_score INTEGER NOT NULL, single_player INTEGER NOT NULL, comment TEXT,
+        UNIQUE (game_id, seed))""",
+    "CREATE INDEX IF NOT EXISTS games_variant_finished ON games (variant, finished_at)",
+    "CREATE INDEX IF NOT EXISTS games_finished ON games (finished_at)",
+    f"""CREATE TABLE IF NOT EXISTS players (
+        game INTEGER NOT NULL REFERENCES games (id), seat INTEGER NOT NULL,
+        {', '.join(f'{field} TEXT' for field in PLAYER_FIELDS)}, age_years INTEGER, score INTEGER NOT NULL,
+        PRIMARY KEY (game, seat)) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS players_gender ON players (gender, game)",
+    "CREATE INDEX IF NOT EXISTS players_nationality ON players (nationality, game)",
+    "CREATE INDEX IF NOT EXISTS players_education ON players (education, game)",
+    "CREATE INDEX IF NOT EXISTS players_age ON players (age_years, game)",
+    f"""CREATE TABLE IF NOT EXISTS rounds (
+        game INTEGER NOT NULL REFERENCES games (id), {', '.join(f'{field} INTEGER NOT NULL' for field in ROUND_FIELDS)},
+        PRIMARY KEY (game, round)) WITHOUT ROWID""",
+]
+
+def _age_years(text):
+    try:
+        return int(str(text).strip())
+    except ValueError:
+        return None
+
+class GameArchive:
+    def __init__(self, path, batch_size=500, interval=1.0, pool_size=4):
+        self.path = path
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue = queue.Queue()
+        self._pool = ConnectionPool(self._connect, pool_size)
+        self._writer = None
+        with self._pool.connection() as conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    # --- Writing ---
+
+    def add(self, game_id, entry, finished_at=None):
+        """Queue a finished game (its entry as kept in the store). Adding the same game twice keeps the first."""
+        model = entry['model']
+        if model is None or not model.game_over:
+            return
+        players = []
+        for seat, info in enumerate((entry['p1_info'], entry['p2_info'])):
+            info = info or {}
+            players.append([seat] + [str(info.get(field, '')) for field in PLAYER_FIELDS]
+                           + [_age_years(info.get('age', '')), model.players[seat].victory_points])
+        row = (game_id, str(model.seed), model.variant, finished_at or time.time(), model.current_round, model.forest,
+               model.players[0].victory_points, model.players[1].victory_points, int(bool(entry.get('bot'))))
+        self._queue.put(('game', row, players, list(model.round_stats)))
+        if self._writer is None:
+            self.flush()
+
+    def set_comment(self, game_id, seed, comment):
+        """Queue the players' comment for an archived game (the last one given wins)."""
+        self._queue.put(('comment', (comment, game_id, str(seed))))
+        if self._writer is None:
+            self.flush()
+
+    def start(self):
+        """Start the background writer (once per process) and write what is left on exit."""
+        if self._writer is not None:
+            return
+        def run():
+            while True:
+                try:
+                    self._write_batch(block=True)
+                except Exception:
+                    logger.exception("Archive write failed")
+        self._writer = threading.Thread(target=run, name='game-archive', daemon=True)
+        self._writer.start()
+        atexit.register(self.flush)
+
+    def flush(self):
+        """Write everything queued so far."""
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.join()
+            return
+        while not self._queue.empty():
+            self._write_batch(block=False)
+
+    def _write_batch(self, block):
+        try:
+            batch = [self._queue.get(timeout=self.interval) if block else self._queue.get_nowait()]
+        except queue.Empty:
+            return
+        try:
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._pool.run(self._write_items, batch)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write_items(self, conn, batch):
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for item in batch:
+                if item[0] == 'game':
+                    self._insert_game(conn, *item[1:])
+                else:
+                    conn.execute('UPDATE games SET comment = ? WHERE game_id = ? AND seed = ?', item[1])
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _insert_game(self, conn, row, players, rounds):
+        cursor = conn.execute('INSERT OR IGNORE INTO games (game_id, seed, variant, finished_at, rounds, final_forest, '
+                              'p1_score, p2_score, single_player) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', row)
+        if not cursor.rowcount:
+            return   # already archived
+        game = cursor.lastrowid
+        conn.executemany(f"INSERT INTO players (game, seat, {', '.join(PLAYER_FIELDS)}, age_years, score) "
+                         f"VALUES (?, {', '.join('?' for _ in PLAYER_FIELDS)}, ?, ?, ?)",
+                         [[game] + player for player in players])
+        conn.executemany(f"INSERT INTO rounds (game, {', '.join(ROUND_FIELDS)}) "
+                         f"VALUES (?, {', '.join('?' for _ in ROUND_FIELDS)})",
+                         [(game,) + tuple(record) for record in rounds])
+
+    # --- Reading ---
+
+    def _where(self, variant=None, since=None, until=None, age_min=None, age_max=None, **player_filters):
+        clauses, params = [], []
+        if variant is not None:
+            clauses.append('g.variant = ?')
+            params.append(variant)
+        if since is not None:
+            clauses.append('g.finished_at >= ?')
+            params.append(since)
+        if until is not None:
+            clauses.append('g.finished_at < ?')
+            params.append(until)
+        for field in PLAYER_FILTERS:
+            if player_filters.get(field) is not None:
+                clauses.append(f'g.id IN (SELECT game FROM players WHERE {field} = ?)')
+                params.append(player_filters[field])
+        if age_min is not None or age_max is not None:
+            clauses.append('g.id IN (SELECT game FROM players WHERE age_years BETWEEN ? AND ?)')
+            params += [age_min if age_min is not None else 0, age_max if age_max is not None else 1000]
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def count(self, **filters):
+        where, params = self._where(**filters)
+        return self._pool.run(lambda conn: conn.execute(f'SELECT COUNT(*) FROM games g{where}', params).fetchone()[0])
+
+    def query(self, limit=100, offset=0, **filters):
+        """Archived games matching the filters, newest first, as dicts with their two players.
+
+        Filters: variant, since/until (finished_at, epoch seconds), age_min/age_max, and exact
+        nationality, gender or education of either player.
+        """
+        where, params = self._where(**filters)
+        def read(conn):
+            games = [dict(row) for row in conn.execute(
+                f'SELECT g.* FROM games g{where} ORDER BY g.finished_at DESC, g.id DESC LIMIT ? OFFSET ?',
+                params + [limit, offset])]
+            if games:
+                ids = [game['id'] for game in games]
+                players = {}
+                for row in conn.execute(f"SELECT * FROM players WHERE game IN ({', '.join('?' for _ in ids)}) "
+                                        f"ORDER BY game, seat", ids):
+                    players.setdefault(row['game'], []).append({key: row[key] for key in row.keys() if key != 'game'})
+                for game in games:
+                    game['players'] = players.get(game['id'], [])
+            return games
+        return self._pool.run(read)
+
+    def iter_games(self, batch_size=500, **filters):
+        """Every archived game matching the filters, oldest first, with its players and `round_stats` records.
+
+        Reads `batch_size` games at a time (keyset paging on the id), so memory use
+        does not grow with the number of games. The connection is only borrowed
+        while a batch is read, not while the caller consumes it.
+        """
+        where, params = self._where(**filters)
+        where = (where + ' AND' if where else ' WHERE') + ' g.id > ?'
+        def read(conn, last):
+            games = [dict(row) for row in conn.execute(
+                f'SELECT g.* FROM games g{where} ORDER BY g.id LIMIT ?', params + [last, batch_size])]
+            players, rounds = {}, {}
+            if games:
+                ids = [game['id'] for game in games]
+                marks = ', '.join('?' for _ in ids)
+                for row in conn.execute(f'SELECT * FROM players WHERE game IN ({marks}) ORDER BY game, seat', ids):
+                    players.setdefault(row['game'], []).append({field: row[field] for field in PLAYER_FIELDS})
+                for row in conn.execute(f"SELECT game, {', '.join(ROUND_FIELDS)} FROM rounds WHERE game IN ({marks}) "
+                                        f"ORDER BY game, round", ids):
+                    rounds.setdefault(row[0], []).append(tuple(row)[1:])
+            return games, players, rounds
+        last = 0
+        while True:
+            games, players, rounds = self._pool.run(read, last)
+            if not games:
+                return
+            last = games[-1]['id']
+            for game in games:
+                game['players'] = players.get(game['id'], [])
+                game['round_stats'] = rounds.get(game['id'], [])
+                yield game
+
+    def rounds(self, archive_id):
+        """The round_stats records of one archived game, in ROUND_FIELDS order."""
+        return self._pool.run(lambda conn: [tuple(row) for row in conn.execute(
+            f"SELECT {', '.join(ROUND_FIELDS)} FROM rounds WHERE game = ? ORDER BY round", (archive_id,))])
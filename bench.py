@@ -0,0 +1,238 @@
+"""Load test / benchmark for the game's HTTP flow.
+
+Drives complete games end to end: /start -> /join/<id> -> harvest, replant,
+buy VP, buy WC and end turn for every turn until the game ends (each action
+followed by the /game page the browser would load) -> /download_log. While
+one player acts, the other polls /game_status and /state like an open page.
+
+    python bench.py --games 200 --concurrency 8                # in-process, app.test_client()
+    python bench.py --mode http --games 200 --concurrency 8    # real HTTP on 127.0.0.1
+    python bench.py --save-baseline bench_baseline.json        # record a baseline
+    python bench.py --compare bench_baseline.json              # exit 1 on a regression
+
+Reports request throughput, per-route latency percentiles and the memory held
+per active game. Baselines are only comparable on the same machine.
+"""
+import argparse, gc, http.client, json, os, random, sys, threading, time, tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+# Synthetic games must not end up in the research archive
+os.environ['ARCHIVE_DB'] = ''
+import app as game_app
+
+# A route is flagged when its p50 or p99 grows by more than this fraction over the baseline
+REGRESSION_TOLERANCE = 0.25
+
+class TestClient:
+    """One browser, served in-process by Flask's test client."""
+
+    def __init__(self, server=None):
+        self.client = game_app.app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        return response.status_code, response.headers, response.get_data()
+
+class HttpClient:
+    """One browser talking real HTTP to the local server (keeps the session cookie)."""
+
+    def __init__(self, server):
+        self.host, self.port = server.server_address[:2]
+        self.cookie = None
+
+    def request(self, method, path, data=None):
+        body = urlencode(data) if data else None
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'} if body else {}
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            payload = response.read()
+        finally:
+            conn.close()
+        cookie = response.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        return response.status, response.headers, payload
+
+class Recorder:
+    """Collects latencies (seconds) per route label from every worker thread."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def call(self, client, label, method, path, data=None, expect=(200, 302, 304)):
+        start = time.perf_counter()
+        status, headers, body = client.request(method, path, data)
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.samples[label].append(elapsed)
+            if status not in expect:
+                self.errors[label] += 1
+        return status, headers, body
+
+def play_game(make_client, recorder, rng, polls):
+    """Play one full game with scripted (slightly random) choices for both players."""
+    p1, p2 = make_client(), make_client()
+    status, headers, _ = recorder.call(p1, 'POST /start', 'POST', '/start',
+                                       {'name': 'Bench 1', 'variant': str(rng.randint(1, 3))})
+    game_id = headers['Location'].rstrip('/').rsplit('/', 1)[1]
+    recorder.call(p1, 'GET /wait/<id>', 'GET', f'/wait/{game_id}')
+    recorder.call(p2, 'GET /join/<id>', 'GET', f'/join/{game_id}')
+    recorder.call(p2, 'POST /join/<id>', 'POST', f'/join/{game_id}', {'name': 'Bench 2'})
+    players = [p1, p2]
+    version = 0
+    for _ in range(200):   # far more turns than a game can last
+        _, _, body = recorder.call(p1, 'GET /game_status/<id>', 'GET', f'/game_status/{game_id}')
+        status = json.loads(body)
+        if status.get('game_over'):
+            break
+        me, other = players[status['current_player']], players[1 - status['current_player']]
+        turn = [('POST /harvest', '/harvest', None)]
+        if rng.random() < 0.3:
+            turn.append(('POST /replant', '/replant', {'amount': str(rng.randint(0, 2))}))
+        turn.append(('POST /buy_vp', '/buy_vp', {'amount': str(rng.randint(0, 2))}))
+        if rng.random() < 0.3:
+            turn.append(('POST /buy_wc', '/buy_wc', {'amount': '1'}))
+        turn.append(('POST /end_turn', '/end_turn', None))
+        for label, path, data in turn:
+            recorder.call(me, label, 'POST', path, data)
+            recorder.call(me, 'GET /game', 'GET', '/game')
+            # The waiting player's page polls while the other one plays
+            for _ in range(polls):
+                recorder.call(other, 'GET /game_status/<id>', 'GET', f'/game_status/{game_id}')
+                _, _, body = recorder.call(other, 'GET /state/<id>?since', 'GET', f'/state/{game_id}?since={version}')
+                version = json.loads(body).get('version', version)
+    recorder.call(p1, 'POST /download_log', 'POST', '/download_log', {'comment': 'benchmark'})
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def measure_game_memory(n_games=200, rounds=10):
+    """Average bytes held per active game, measured with tracemalloc on games played to `rounds`."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    models = []
+    for _ in range(n_games):
+        model = game_app.GameModel(1, [{'name': 'A'}, {'name': 'B'}])
+        while model.current_round < rounds and not model.game_over:
+            player = model.current_player
+            model.act(player, 'harvest')
+            model.act(player, 'buy_vp', model.players[player].harvested_trees // 2)
+            model.act(player, 'end_turn')
+        models.append(model)
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    used = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return used / n_games
+
+def run(mode='client', games=100, concurrency=4, polls=1, seed=0):
+    # Every simulated browser polls as fast as it can; measure the app, not the rate limiter
+    game_app.app.config['RATE_LIMIT'] = False
+    server = None
+    if mode == 'http':
+        from werkzeug.serving import WSGIRequestHandler, make_server
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass   # one line per request would swamp the report
+        server = make_server('127.0.0.1', 0, game_app.app, threaded=True, request_handler=QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    client_class = HttpClient if mode == 'http' else TestClient
+    recorder = Recorder()
+    rngs = [random.Random(seed * 100003 + i) for i in range(games)]
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(lambda rng: play_game(lambda: client_class(server), recorder, rng, polls), rngs))
+    finally:
+        if server is not None:
+            server.shutdown()
+    elapsed = time.perf_counter() - start
+    routes = {}
+    for label, samples in sorted(recorder.samples.items()):
+        samples.sort()
+        routes[label] = {
+            'count': len(samples),
+            'errors': recorder.errors.get(label, 0),
+            'p50_ms': round(percentile(samples, 0.50) * 1000, 3),
+            'p95_ms': round(percentile(samples, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(samples, 0.99) * 1000, 3),
+            'max_ms': round(samples[-1] * 1000, 3),
+        }
+    total = sum(route['count'] for route in routes.values())
+    return {
+        'mode': mode, 'games': games, 'concurrency': concurrency, 'polls': polls,
+        'seconds': round(elapsed, 3),
+        'requests': total,
+        'requests_per_second': round(total / elapsed, 1),
+        'games_per_second': round(games / elapsed, 2),
+        'bytes_per_active_game': round(measure_game_memory()),
+        'routes': routes,
+    }
+
+def print_report(result):
+    print(f"{result['games']} games, {result['requests']} requests in {result['seconds']}s "
+          f"({result['mode']} mode, concurrency {result['concurrency']}, {result['polls']} poll(s) per action)")
+    print(f"throughput: {result['requests_per_second']} req/s, {result['games_per_second']} games/s; "
+          f"memory: {result['bytes_per_active_game']} bytes per active game")
+    print(f"{'route':32} {'count':>7} {'err':>4} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for label, route in result['routes'].items():
+        print(f"{label:32} {route['count']:>7} {route['errors']:>4} {route['p50_ms']:>8} "
+              f"{route['p95_ms']:>8} {route['p99_ms']:>8} {route['max_ms']:>8}")
+
+def compare(result, baseline, tolerance=REGRESSION_TOLERANCE):
+    """List human-readable regressions of `result` against `baseline`."""
+    problems = []
+    if result['requests_per_second'] < baseline['requests_per_second'] * (1 - tolerance):
+        problems.append(f"throughput {result['requests_per_second']} req/s < baseline {baseline['requests_per_second']}")
+    if result['bytes_per_active_game'] > baseline['bytes_per_active_game'] * (1 + tolerance):
+        problems.append(f"memory {result['bytes_per_active_game']} B/game > baseline {baseline['bytes_per_active_game']}")
+    for label, route in result['routes'].items():
+        base = baseline['routes'].get(label)
+        if not base:
+            continue
+        for key in ('p50_ms', 'p99_ms'):
+            if route[key] > base[key] * (1 + tolerance):
+                problems.append(f"{label} {key} {route[key]} > baseline {base[key]}")
+        if route['errors'] > base['errors']:
+            problems.append(f"{label} errors {route['errors']} > baseline {base['errors']}")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark complete games through the Flask app.")
+    parser.add_argument('--mode', choices=('client', 'http'), default='client')
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--polls', type=int, default=1, help="status polls by the waiting player per action")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help="print the raw result as JSON")
+    parser.add_argument('--save-baseline', metavar='FILE')
+    parser.add_argument('--compare', metavar='FILE')
+    args = parser.parse_args()
+    result = run(args.mode, args.games, args.concurrency, args.polls, args.seed)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            problems = compare(result, json.load(f))
+        for problem in problems:
+            print("REGRESSION:", problem)
+        if problems:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""Computer opponent: depth-limited expectimax over the exact harvest distribution.
+
+The bot plays its turn through `GameModel.act` like a person pressing the
+buttons: it harvests (real dice), then searches for the best way to spend the
+harvest and applies it as buy_wc, replant, exchange, buy_vp and end_turn.
+
+The search looks `depth` of the bot's own turns ahead. Chance nodes use the
+exact dice distribution from `harvest_cumulative` (merged into at most
+`outcomes` probability buckets below the root), the other player is modelled as
+harvesting with its current woodcutters, and leaves are scored with an
+estimate of the bot's final victory points. Values of states reached again,
+by other branches or on later turns, come from a bounded transposition cache.
+
+Search state, as a tuple (hashable, so it can key the cache):
+    (variant, round, forest, replant_buffer, woodcutters, victory_points, trees, opponent_woodcutters, seat)
+"""
+from functools import lru_cache
+
+from models import harvest_cumulative, WOODCUTTER_COST, EXCHANGE_VALUE, FOREST_MAX, MAX_ROUNDS
+
+DEFAULT_DEPTH = 1          # own turns searched beyond the current one
+DEFAULT_OUTCOMES = 5       # dice outcomes kept per chance node below the root
+TRANSPOSITION_SIZE = 200000
+MEAN_TREES_PER_WOODCUTTER = 7 / 6   # (0 * 1 + 1 * 3 + 2 * 2) / 6
+
+@lru_cache(maxsize=512)
+def harvest_outcomes(woodcutters, buckets=None):
+    """(trees, probability) pairs for the dice total of `woodcutters` woodcutters.
+
+    With `buckets`, consecutive totals are merged into at most that many groups
+    of roughly equal probability, each represented by its rounded mean.
+    """
+    cumulative = harvest_cumulative(woodcutters)
+    total = cumulative[-1]
+    exact = [(trees, (cumulative[trees] - (cumulative[trees - 1] if trees else 0)) / total)
+             for trees in range(len(cumulative))]
+    exact = [(trees, p) for trees, p in exact if p > 0]
+    if buckets is None or len(exact) <= buckets:
+        return tuple(exact)
+    merged, mass, weighted, filled = [], 0.0, 0.0, 0.0
+    for trees, p in exact:
+        mass += p
+        weighted += trees * p
+        if filled + mass >= (len(merged) + 1) / buckets - 1e-12:
+            merged.append((round(weighted / mass), mass))
+            filled += mass
+            mass = weighted = 0.0
+    if mass:
+        merged.append((round(weighted / mass), mass))
+    return tuple(merged)
+
+def final_score(state):
+    """Victory points the bot ends with if the game ends in `state` (leftover trees and Hubbert penalty)."""
+    variant, _, _, _, woodcutters, vp, trees, _, _ = state
+    return vp + trees // 2 - (woodcutters - 1 if variant == 2 else 0)
+
+def estimate(state):
+    """Leaf score at the start of the bot's turn: current points plus a share of the trees still to come."""
+    variant, rnd, forest, buffer, woodcutters, vp, trees, opponent, seat = state
+    turns = MAX_ROUNDS - rnd
+    mine = MEAN_TREES_PER_WOODCUTTER * woodcutters
+    theirs = MEAN_TREES_PER_WOODCUTTER * opponent
+    supply = forest + buffer
+    future = min(turns * mine, supply * mine / (mine + theirs))
+    bonus = 0
+    if variant == 3:
+        # Every 5th round each player gets 10% of the forest
+        for bonus_round in range(rnd + 1, MAX_ROUNDS + 1):
+            if bonus_round % 5 == 0:
+                bonus += max(0, supply - (bonus_round - rnd) * (mine + theirs)) // 10
+    return final_score(state) + future / 2 + bonus
+
+def plans(state, exchanges_done=0):
+    """Candidate ways to spend the harvested trees: (buy_wc, replant, exchanges, buy_vp).
+
+    A few representative amounts per action keep the branching factor small;
+    whatever is left after buying and replanting is banked as victory points.
+    """
+    variant, rnd, forest, buffer, woodcutters, vp, trees, _, _ = state
+    found = set()
+    for buy in {0, 1, trees // WOODCUTTER_COST}:
+        if buy * WOODCUTTER_COST > trees:
+            continue
+        left = trees - buy * WOODCUTTER_COST
+        room = min(left, (FOREST_MAX - forest - buffer) // 3)
+        for replant in {0, room // 2, room} if room > 0 else {0}:
+            exchanges = (0, min(2 - exchanges_done, woodcutters - 1)) if buy == 0 else (0,)
+            for exchange in set(exchanges):
+                found.add((buy, replant, max(exchange, 0), (left - replant) // 2))
+    return sorted(found)
+
+def apply_plan(state, plan):
+    variant, rnd, forest, buffer, woodcutters, vp, trees, opponent, seat = state
+    buy, replant, exchange, bank = plan
+    return (variant, rnd, forest, buffer + 3 * replant, woodcutters + buy - exchange,
+            vp + exchange * EXCHANGE_VALUE + bank, trees - buy * WOODCUTTER_COST - replant - 2 * bank, opponent, seat)
+
+def end_round(state):
+    """Regrowth, the Sustainable bonus and the round counter, as `GameModel.end_round` does.
+    Returns the new state and whether the game is over."""
+    variant, rnd, forest, buffer, woodcutters, vp, trees, opponent, seat = state
+    rnd += 1
+    forest = min(forest + buffer, FOREST_MAX)
+    if variant == 3 and rnd % 5 == 0:
+        vp += forest // 10
+    return (variant, rnd, forest, 0, woodcutters, vp, trees, opponent, seat), forest <= 0 or rnd >= MAX_ROUNDS
+
+def after_turn(state, depth, outcomes):
+    """Expected value once the bot has ended its turn in `state`."""
+    if state[8] == 1:   # the bot is Player 2: its end_turn closes the round
+        state, over = end_round(state)
+        if over:
+            return final_score(state)
+    variant, rnd, forest, buffer, woodcutters, vp, trees, opponent, seat = state
+    value = 0.0
+    for harvested, p in harvest_outcomes(opponent, outcomes):
+        left = forest - min(harvested, forest)
+        if left <= 0:
+            value += p * final_score(state)
+            continue
+        nxt = (variant, rnd, left, buffer, woodcutters, vp, trees, opponent, seat)
+        if seat == 0:
+            nxt, over = end_round(nxt)
+            if over:
+                value += p * final_score(nxt)
+                continue
+        value += p * turn_value(nxt, depth, outcomes)
+    return value
+
+@lru_cache(maxsize=TRANSPOSITION_SIZE)
+def turn_value(state, depth, outcomes):
+    """Expected value at the start of a bot turn (before its harvest)."""
+    if depth <= 0:
+        return estimate(state)
+    variant, rnd, forest, buffer, woodcutters, vp, trees, opponent, seat = state
+    value = 0.0
+    for harvested, p in harvest_outcomes(woodcutters, outcomes):
+        taken = min(harvested, forest)
+        after = (variant, rnd, forest - taken, buffer, woodcutters, vp, trees + taken, opponent, seat)
+        if forest - taken <= 0:
+            value += p * final_score(after)   # the harvest depleted the forest
+            continue
+        value += p * max(after_turn(apply_plan(after, plan), depth - 1, outcomes) for plan in plans(after))
+    return value
+
+def search_state(model, player_idx):
+    player, opponent = model.players[player_idx], model.players[1 - player_idx]
+    return (model.variant, model.current_round, model.forest, model.replant_buffer, player.woodcutters,
+            player.victory_points, player.harvested_trees, opponent.woodcutters, player_idx)
+
+def choose_plan(model, player_idx, depth=DEFAULT_DEPTH, outcomes=DEFAULT_OUTCOMES):
+    """Best (buy_wc, replant, exchanges, buy_vp) for a player who has already harvested this turn."""
+    state = search_state(model, player_idx)
+    exchanges_done = model.players[player_idx].exchanges_this_round
+    return max(plans(state, exchanges_done),
+               key=lambda plan: after_turn(apply_plan(state, plan), depth, outcomes))
+
+def play_turn(model, player_idx=1, depth=DEFAULT_DEPTH, outcomes=DEFAULT_OUTCOMES):
+    """Play a whole turn for `player_idx` through `model.act`. Returns the accepted (action, amount) pairs in order."""
+    if model.game_over or model.current_player != player_idx:
+        return []
+    played = []
+    def act(action, amount=0):
+        if model.act(player_idx, action, amount) is None:
+            played.append((action, amount))
+    act('harvest')
+    if model.game_over:
+        return played   # the harvest depleted the forest
+    buy, replant, exchange, bank = choose_plan(model, player_idx, depth, outcomes)
+    if buy:
+        act('buy_wc', buy)
+    if replant:
+        act('replant', replant)
+    for _ in range(exchange):
+        act('exchange')
+    if bank:
+        act('buy_vp', bank)
+    act('end_turn')
+    return played
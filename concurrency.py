@@ -0,0 +1,82 @@
+"""Support for running under gunicorn's cooperative gevent worker (WORKER_MODE=gevent, see gunicorn.conf.py).
+
+Under gevent every connection is a greenlet on a single OS thread, so an idle
+event stream or waiting page costs a few kilobytes instead of a thread. The
+standard library's sockets, `time.sleep` and the `threading` locks and
+conditions (the per-game locks, the event broker) become cooperative once
+gevent has patched them. A few system calls still stop the whole worker while
+they wait, such as `flock()` on a game's lock file while another process holds
+it, or `fsync()` in the journal. `blocking(function, *args)` runs such a call on
+gevent's pool of real threads when the worker is cooperative, and calls it
+directly otherwise.
+
+`threading.local` is per greenlet under gevent, so anything kept per thread
+(such as a database connection) would be kept per open request. The SQLite
+stores borrow their connections from a `ConnectionPool` instead, and run their
+statements through `pool.run`: SQLite waits for another process's write lock
+inside C (up to the connection's busy timeout), so under gevent the pool runs
+them on threads of its own.
+
+`original(module, name)` gives the unpatched function (e.g. the real
+`_thread.start_new_thread`) for code that needs an OS thread, such as the
+sampling profiler.
+"""
+import importlib, queue, sys, threading
+from contextlib import contextmanager
+
+def cooperative():
+    """True when gevent has patched `threading` in this process (the gevent worker does so before loading the app)."""
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('threading')
+
+def blocking(function, *args):
+    """Call `function(*args)` without stalling other greenlets."""
+    if cooperative():
+        import gevent
+        return gevent.get_hub().threadpool.apply(function, args)
+    return function(*args)
+
+def original(module, name):
+    """`module.name` as it was before gevent patched it (the same object when nothing is patched)."""
+    if cooperative():
+        from gevent import monkey
+        return monkey.get_original(module, name)
+    return getattr(importlib.import_module(module), name)
+
+class ConnectionPool:
+    """At most `size` connections made by `connect()`, each lent to one thread or greenlet at a time.
+
+        rows = pool.run(lambda conn: conn.execute(...).fetchall())
+
+    `run(function, *args)` calls `function(conn, *args)` with a borrowed
+    connection, on one of the pool's `size` threads under gevent. Connections
+    are opened on first need and reused afterwards. A borrower waits while all
+    `size` are lent out, so never borrow a second one while holding the first.
+    """
+    def __init__(self, connect, size=8):
+        self._connect = connect
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._free = threading.BoundedSemaphore(size)
+        self._threads = None   # gevent ThreadPool, made on first use under gevent
+
+    def run(self, function, *args):
+        with self.connection() as conn:
+            if not cooperative():
+                return function(conn, *args)
+            if self._threads is None:
+                from gevent.threadpool import ThreadPool
+                self._threads = ThreadPool(self.size)
+            return self._threads.apply(function, (conn,) + args)
+
+    @contextmanager
+    def connection(self):
+        with self._free:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                yield conn
+            finally:
+                self._idle.put(conn)
@@ -0,0 +1,161 @@
+"""Running aggregates over the games of a session, for the instructors' dashboard.
+
+Each game contributes one small record (its state, variant, round, forest
+bucket and victory points). `update(game_id, entry)` swaps a game's old record
+for its new one and `remove(game_id)` takes it out, so keeping the aggregates
+current costs O(1) per change, and `snapshot()` costs the same however many
+games there are:
+
+    dashboard.update(game_id, entry)     # created, joined, after each accepted action
+    dashboard.remove(game_id)            # evicted or deleted
+
+Games in play (lobbies and active games) are counted while they are held.
+Finished games are added to the session totals (games finished, forests
+collapsed, final victory points per variant) once, and stay counted after the
+store evicts them.
+
+The aggregates cover the games this worker process has seen change, like the
+counters behind /metrics. With a store shared by several workers, a game can
+move on or be evicted by another worker; `start_sync` re-reads the games whose
+store entry changed and drops the ones that are gone, so the records neither
+go stale nor pile up.
+"""
+import logging, threading, time
+from collections import Counter
+
+from models import FOREST_MAX, MAX_ROUNDS
+
+logger = logging.getLogger(__name__)
+
+FOREST_BUCKET = 10    # trees per bar of the forest distribution
+
+class SessionDashboard:
+    def __init__(self, variants):
+        self.variants = dict(variants)       # variant -> name
+        self._games = {}                     # game_id -> current record
+        self._marks = {}                     # game_id -> store mark seen by the last sync
+        self._syncer = None
+        self._lock = threading.Lock()
+        self._states = Counter()             # 'lobby' / 'active' -> games
+        self._forest = [0] * (FOREST_MAX // FOREST_BUCKET + 1)
+        self._rounds = [0] * MAX_ROUNDS
+        self._live = {variant: [0, 0, 0] for variant in self.variants}      # active games, players, points
+        self._finished = {variant: [0, 0, 0] for variant in self.variants}  # finished games, collapsed, points
+
+    def _record(self, entry):
+        model = entry['model']
+        if model is None:
+            return ('lobby', entry['variant'])
+        if model.game_over:
+            return ('finished', model.variant)
+        return ('active', model.variant, min(model.current_round, MAX_ROUNDS - 1), model.forest // FOREST_BUCKET,
+                model.players[0].victory_points + model.players[1].victory_points)
+
+    def _apply(self, record, sign):
+        state, variant = record[0], record[1]
+        self._states[state] += sign
+        if state == 'active':
+            _, _, rnd, bucket, points = record
+            self._rounds[rnd] += sign
+            self._forest[bucket] += sign
+            live = self._live.setdefault(variant, [0, 0, 0])
+            live[0] += sign
+            live[1] += 2 * sign
+            live[2] += points * sign
+
+    def update(self, game_id, entry):
+        """Record a game's current state (call after it was created or changed)."""
+        record = self._record(entry)
+        with self._lock:
+            old = self._games.get(game_id)
+            if old == record:
+                return
+            if old is not None:
+                if old[0] == 'finished':
+                    return   # counted once; a finished game does not change any more
+                self._apply(old, -1)
+            self._games[game_id] = record
+            if record[0] == 'finished':
+                model = entry['model']
+                totals = self._finished.setdefault(record[1], [0, 0, 0])
+                totals[0] += 1
+                totals[1] += model.forest <= 0
+                totals[2] += model.players[0].victory_points + model.players[1].victory_points
+            else:
+                self._apply(record, 1)
+
+    def remove(self, game_id):
+        """Forget a game that left the store (finished games stay in the session totals)."""
+        with self._lock:
+            old = self._games.pop(game_id, None)
+            self._marks.pop(game_id, None)
+            if old is not None and old[0] != 'finished':
+                self._apply(old, -1)
+
+    def sync(self, marks, load):
+        """Catch up with changes made by other workers to a shared store.
+
+        `marks(game_ids)` maps each game still held to a value that changes whenever
+        it is saved (`store.last_touched`) and `load(game_id)` reads its entry. Games
+        gone from the store are removed; games saved since the last sync are re-read.
+        """
+        with self._lock:
+            game_ids = list(self._games)
+        current = marks(game_ids)
+        for game_id in game_ids:
+            mark = current.get(game_id)
+            with self._lock:
+                record = self._games.get(game_id)
+                seen = self._marks.get(game_id)
+            if mark is None:
+                self.remove(game_id)
+            elif record is not None and record[0] != 'finished' and mark != seen:
+                entry = load(game_id)
+                if entry is None:
+                    self.remove(game_id)
+                    continue
+                self.update(game_id, entry)
+                with self._lock:
+                    if game_id in self._games:
+                        self._marks[game_id] = mark
+
+    def start_sync(self, marks, load, interval=5):
+        """Run `sync(marks, load)` every `interval` seconds in a daemon thread (once per process)."""
+        if self._syncer is not None:
+            return
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.sync(marks, load)
+                except Exception:
+                    logger.exception("Dashboard sync failed")
+        self._syncer = threading.Thread(target=run, name='dashboard-sync', daemon=True)
+        self._syncer.start()
+
+    def snapshot(self):
+        """The aggregates as a JSON-ready dict."""
+        with self._lock:
+            variants = {}
+            for variant in sorted(set(self._live) | set(self._finished)):
+                active, players, points = self._live.get(variant, (0, 0, 0))
+                finished, collapsed, final_points = self._finished.get(variant, (0, 0, 0))
+                variants[variant] = {
+                    'name': self.variants.get(variant, ''),
+                    'active': active,
+                    'avg_vp': round(points / players, 2) if players else None,
+                    'finished': finished,
+                    'collapsed': collapsed,
+                    'avg_final_vp': round(final_points / (2 * finished), 2) if finished else None,
+                }
+            return {
+                'lobbies': self._states['lobby'],
+                'active': self._states['active'],
+                'finished': sum(totals[0] for totals in self._finished.values()),
+                'collapsed': sum(totals[1] for totals in self._finished.values()),
+                # Active games per forest size: [0-9 trees, 10-19, ..., 90-99, 100]
+                'forest': list(self._forest),
+                # Active games per round being played: [round 1, ..., round MAX_ROUNDS]
+                'rounds': list(self._rounds),
+                'variants': variants,
+            }
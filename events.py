@@ -0,0 +1,94 @@
+"""In-process notification of game state changes, used by the Server-Sent Events stream.
+
+Action handlers call `broker.publish(game_id)` after changing a game; open
+`/events/<game_id>` streams wait on a subscription until that happens.
+Events only say "something changed" - the stream re-reads the game from the
+store, so the store stays the single source of truth.
+
+With a store shared by several worker processes, changes made by another
+worker are found by `watch`: one background poll per process for all the
+games that have listeners, instead of every open stream polling on its own.
+"""
+import logging, threading, time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+class Subscription:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.seq = 0
+        self.listeners = 0
+
+    def wait(self, seq, timeout):
+        """Block until an event newer than `seq` arrives. Returns False on timeout."""
+        with self.cond:
+            if self.seq == seq:
+                self.cond.wait(timeout)
+            return self.seq != seq
+
+class EventBroker:
+    def __init__(self):
+        self._channels = {}
+        self._listeners = 0   # open subscriptions over all games
+        self._guard = threading.Lock()
+        self._watcher = None
+
+    def publish(self, game_id):
+        """Wake every stream subscribed to this game."""
+        with self._guard:
+            channel = self._channels.get(game_id)
+        if channel is None:
+            return   # nobody is listening
+        with channel.cond:
+            channel.seq += 1
+            channel.cond.notify_all()
+
+    @contextmanager
+    def subscribe(self, game_id):
+        """Yield the game's Subscription; read `sub.seq` before reading game state, then `sub.wait(seq, ...)`."""
+        with self._guard:
+            channel = self._channels.get(game_id)
+            if channel is None:
+                channel = self._channels[game_id] = Subscription()
+            channel.listeners += 1
+            self._listeners += 1
+        try:
+            yield channel
+        finally:
+            with self._guard:
+                channel.listeners -= 1
+                self._listeners -= 1
+                if channel.listeners == 0:
+                    del self._channels[game_id]
+
+    def watch(self, marks, interval=1.0):
+        """Publish changes made outside this process, polling every `interval` seconds in a daemon thread.
+
+        `marks(game_ids)` maps each game still held to a value that changes whenever
+        the game is saved (e.g. `store.last_touched`); games whose value changed or
+        that disappeared are published. Starts once per broker.
+        """
+        if self._watcher is not None:
+            return
+        def run():
+            seen = {}
+            while True:
+                time.sleep(interval)
+                with self._guard:
+                    game_ids = list(self._channels)
+                try:
+                    current = marks(game_ids) if game_ids else {}
+                except Exception:
+                    logger.exception("Polling the store for changes failed")
+                    continue
+                for game_id in game_ids:
+                    if game_id in seen and current.get(game_id) != seen[game_id]:
+                        self.publish(game_id)
+                seen = {game_id: current.get(game_id) for game_id in game_ids}
+        self._watcher = threading.Thread(target=run, name='event-watcher', daemon=True)
+        self._watcher.start()
+
+    def listener_count(self):
+        with self._guard:
+            return self._listeners
@@ -0,0 +1,50 @@
+"""Rendered pieces of the game board, cached per game and state version.
+
+Most reloads of /game (the waiting player's page reloading on every turn
+handoff, both players refreshing) show a board that has not changed since the
+last render. The parts that are the same for both players - the forest panel,
+the player stats and a page of the log - are rendered once per game state and
+reused until an action changes the game:
+
+    html = fragments.get(game_id, (model.seed, model.version), 'players')
+
+A cached fragment is only used for the exact state it was rendered from, so a
+stale entry can never be shown; `invalidate(game_id)` (called by the action
+handlers) just frees it early. At most `capacity` games are kept, least
+recently rendered first out.
+"""
+import threading
+from collections import OrderedDict
+
+class FragmentCache:
+    def __init__(self, capacity=2000):
+        self.capacity = capacity
+        self._games = OrderedDict()   # game_id -> (state, {fragment name: html})
+        self._lock = threading.Lock()
+
+    def get(self, game_id, state, name):
+        """The fragment rendered for this game state, or None."""
+        with self._lock:
+            cached = self._games.get(game_id)
+            if cached is None or cached[0] != state:
+                return None
+            self._games.move_to_end(game_id)
+            return cached[1].get(name)
+
+    def put(self, game_id, state, name, html):
+        with self._lock:
+            cached = self._games.get(game_id)
+            if cached is None or cached[0] != state:
+                cached = self._games[game_id] = (state, {})
+            cached[1][name] = html
+            self._games.move_to_end(game_id)
+            while len(self._games) > self.capacity:
+                self._games.popitem(last=False)
+
+    def invalidate(self, game_id):
+        """Drop a game's fragments (it changed or left the store)."""
+        with self._lock:
+            self._games.pop(game_id, None)
+
+    def __len__(self):
+        return len(self._games)
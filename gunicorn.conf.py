@@ -0,0 +1,22 @@
+"""Gunicorn settings (see the Procfile). Choose the worker type with WORKER_MODE:
+
+    WORKER_MODE=gevent (default)    cooperative green threads: up to WORKER_CONNECTIONS open connections per
+                                    worker at a few kilobytes each
+    WORKER_MODE=threads             gthread workers: one OS thread per open connection, THREADS per worker
+
+Open /events streams and waiting pages hold their connection for minutes, so
+with threads the number of players a worker can serve is its thread count;
+with gevent it is WORKER_CONNECTIONS. The in-memory store needs a single worker
+either way (GAME_STORE=sqlite:///... for several).
+"""
+import os
+
+mode = os.environ.get('WORKER_MODE', 'gevent')
+if mode == 'gevent':
+    worker_class = 'gevent'
+    worker_connections = int(os.environ.get('WORKER_CONNECTIONS', 10000))
+elif mode == 'threads':
+    worker_class = 'gthread'
+    threads = int(os.environ.get('THREADS', 32))
+else:
+    raise ValueError(f"Unknown WORKER_MODE: {mode} (use 'threads' or 'gevent')")
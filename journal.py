@@ -0,0 +1,173 @@
+"""Append-only per-game journal, so a restarted worker can rebuild the games it held.
+
+Each game has a JSON-lines file `<directory>/<game_id>.jsonl`:
+
+    {"t": "snapshot", "entry": {...}}       the whole entry, as `store.encode_entry` writes it
+    {"t": "act", "p": 0, "actions": [["harvest", 0], ["buy_vp", 2]], "v": 7, "f": 93}
+
+An "act" line is one accepted request: the player, the actions with their
+amounts, and the state version and forest size afterwards. Replaying the
+actions through `GameModel.act` reproduces the game exactly (the dice come from
+the game's own seed), and "v"/"f" catch a journal that does not match its
+snapshot. A snapshot is written when the game is created or joined, every
+`snapshot_rounds` rounds and when it ends; it replaces the file, so recovery
+reads one snapshot plus at most a few rounds of actions.
+
+Writes are queued and a background thread appends them and fsyncs each
+touched file every `interval` seconds (group commit). An action acknowledged
+less than `interval` before a crash can be lost.
+"""
+import atexit, json, logging, os, threading
+
+from store import encode_entry, decode_entry
+from concurrency import blocking
+
+logger = logging.getLogger(__name__)
+
+class GameJournal:
+    def __init__(self, directory, interval=0.05, snapshot_rounds=5):
+        self.directory = directory
+        self.interval = interval
+        self.snapshot_rounds = snapshot_rounds
+        os.makedirs(directory, exist_ok=True)
+        self._pending = []      # (game_id, line, replaces_file) in the order they were recorded
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._writer = None
+
+    def path(self, game_id):
+        return os.path.join(self.directory, f"{game_id}.jsonl")
+
+    def snapshot(self, game_id, entry):
+        """Record the whole entry (call with the game's lock held, before it changes again)."""
+        self._enqueue(game_id, f'{{"t":"snapshot","entry":{encode_entry(entry)}}}', True)
+
+    def record(self, game_id, entry, player_idx, actions, round_before):
+        """Record actions accepted for `player_idx`: a list of (action, amount), already applied to entry['model']."""
+        if not actions:
+            return
+        model = entry['model']
+        if model.game_over or model.current_round // self.snapshot_rounds > round_before // self.snapshot_rounds:
+            self.snapshot(game_id, entry)
+            return
+        line = json.dumps({'t': "act", 'p': player_idx, 'actions': [list(item) for item in actions],
+                           'v': model.version, 'f': model.forest}, separators=(',', ':'))
+        self._enqueue(game_id, line, False)
+
+    def discard(self, game_id):
+        """Forget a game that left the store."""
+        self._enqueue(game_id, None, True)
+
+    def _enqueue(self, game_id, line, replaces_file):
+        with self._lock:
+            self._pending.append((game_id, line, replaces_file))
+        if self._writer is None:
+            self.flush()   # no background writer: write through
+
+    def start(self):
+        """Start the background writer (once per process) and flush on exit."""
+        if self._writer is not None:
+            return
+        def run():
+            while True:
+                self._wake.wait(self.interval)
+                self._wake.clear()
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception("Journal flush failed")
+        self._writer = threading.Thread(target=run, name='game-journal', daemon=True)
+        self._writer.start()
+        atexit.register(self.flush)
+
+    def flush(self):
+        """Write and fsync everything recorded so far."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            batches = {}
+            for game_id, line, replaces_file in pending:
+                batch = batches.setdefault(game_id, [False, []])
+                if replaces_file:
+                    batch[0], batch[1] = True, []
+                if line is not None:
+                    batch[1].append(line)
+            for game_id, (replaces_file, lines) in batches.items():
+                self._write(game_id, replaces_file, lines)
+            if any(replaces_file for replaces_file, _ in batches.values()):
+                self._sync_directory()
+
+    def _write(self, game_id, replaces_file, lines):
+        path = self.path(game_id)
+        if replaces_file and not lines:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return
+        data = ''.join(line + '\n' for line in lines)
+        if replaces_file:
+            temporary = path + '.tmp'
+            with open(temporary, 'w') as f:
+                f.write(data)
+                f.flush()
+                blocking(os.fsync, f.fileno())
+            os.replace(temporary, path)
+        else:
+            with open(path, 'a') as f:
+                f.write(data)
+                f.flush()
+                blocking(os.fsync, f.fileno())
+
+    def _sync_directory(self):
+        try:
+            fd = os.open(self.directory, os.O_RDONLY)
+        except OSError:
+            return   # e.g. Windows, where directories cannot be opened
+        try:
+            blocking(os.fsync, fd)
+        finally:
+            os.close(fd)
+
+    def recover(self):
+        """Rebuild every journaled game. Returns a list of (game_id, entry)."""
+        recovered = []
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith('.jsonl'):
+                continue
+            game_id = name[:-len('.jsonl')]
+            try:
+                entry = self.replay(game_id)
+            except Exception:
+                logger.exception("Could not recover game %s from its journal", game_id)
+                continue
+            if entry is not None:
+                recovered.append((game_id, entry))
+        return recovered
+
+    def replay(self, game_id):
+        """Load the game's snapshot and replay the actions after it. None if there is no snapshot."""
+        entry = None
+        with open(self.path(game_id)) as f:
+            for number, text in enumerate(f, 1):
+                try:
+                    record = json.loads(text)
+                except ValueError:
+                    logger.warning("Journal %s: unreadable line %d (torn write?), stopping there", game_id, number)
+                    break
+                if record['t'] == "snapshot":
+                    entry = decode_entry(json.dumps(record['entry']))
+                    continue
+                model = entry['model'] if entry else None
+                if model is None:
+                    logger.warning("Journal %s: actions before the game started, stopping at line %d", game_id, number)
+                    break
+                for action, amount in record['actions']:
+                    error = model.act(record['p'], action, amount)
+                    if error:
+                        raise ValueError(f"line {number}: {action} refused on replay: {error}")
+                if (model.version, model.forest) != (record['v'], record['f']):
+                    raise ValueError(f"line {number}: replay reached version {model.version} / forest "
+                                     f"{model.forest}, journal says {record['v']} / {record['f']}")
+        return entry
@@ -0,0 +1,49 @@
+"""Collision-free game codes and matchmaking queue keys.
+
+Game codes are 6 characters from A-Z0-9, i.e. a number below 36**6. Instead of
+drawing random codes and retrying on a collision, the store hands out
+consecutive numbers (`store.next_number()`) and `GameCodes` maps each number
+to a code through a keyed permutation of [0, 36**6): a 4-round Feistel network
+on 32 bits, cycle-walked back into range. Different numbers always give
+different codes, and without the key the next code cannot be guessed from the
+previous ones. The key must stay secret: the app takes it from GAME_CODE_KEY or
+from the store (`store.code_key()`, random bytes shared by the workers).
+"""
+import hashlib, string
+
+CODE_CHARS = string.ascii_uppercase + string.digits
+CODE_LENGTH = 6
+CODE_SPACE = len(CODE_CHARS) ** CODE_LENGTH   # 2,176,782,336 < 2**32
+FEISTEL_ROUNDS = 4
+
+class GameCodes:
+    def __init__(self, key):
+        self.key = key.encode() if isinstance(key, str) else key
+
+    def _round(self, index, half):
+        digest = hashlib.blake2b(half.to_bytes(2, 'big'), digest_size=2, key=self.key[:64],
+                                 salt=index.to_bytes(16, 'big')).digest()
+        return int.from_bytes(digest, 'big')
+
+    def _permute32(self, value):
+        left, right = value >> 16, value & 0xFFFF
+        for index in range(FEISTEL_ROUNDS):
+            left, right = right, left ^ self._round(index, right)
+        return (left << 16) | right
+
+    def number_to_code(self, number):
+        """The code for `number` (0 <= number < CODE_SPACE); distinct numbers give distinct codes."""
+        if not 0 <= number < CODE_SPACE:
+            raise ValueError("game code space exhausted")
+        value = self._permute32(number)
+        while value >= CODE_SPACE:   # cycle-walk: stays a permutation of [0, CODE_SPACE)
+            value = self._permute32(value)
+        code = []
+        for _ in range(CODE_LENGTH):
+            value, digit = divmod(value, len(CODE_CHARS))
+            code.append(CODE_CHARS[digit])
+        return ''.join(code)
+
+def queue_key(room, variant):
+    """Matchmaking queue for a classroom session code (case-insensitive, may be empty) and a variant."""
+    return f"{room.strip().upper()}:{variant}"
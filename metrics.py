@@ -0,0 +1,181 @@
+"""Process-local metrics in the Prometheus text format, plus an on-demand sampling profiler.
+
+Every gunicorn worker keeps its own numbers; Prometheus should scrape each
+worker (or the numbers are per-worker samples when scraped through a shared port).
+"""
+import sys, threading, time, traceback
+from collections import Counter as _Tally
+
+from concurrency import original
+
+# Latency buckets in seconds (Prometheus convention)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                     for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self._values = _Tally()
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] += amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+class Gauge:
+    """A value read from `callback()` at scrape time. The callback returns a number or {label tuple: number}.
+
+    Pass kind='counter' for totals kept elsewhere (e.g. the store's eviction counts).
+    """
+
+    def __init__(self, name, help_text, callback, labels=(), kind='gauge'):
+        self.name, self.help, self.callback, self.labels, self.kind = name, help_text, callback, tuple(labels), kind
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        value = self.callback()
+        items = sorted(value.items()) if isinstance(value, dict) else [((), value)]
+        for label_values, number in items:
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {number}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help_text, tuple(labels), tuple(buckets)
+        self._series = {}   # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def time(self, *label_values):
+        """Context manager observing the duration of its block."""
+        return _Timer(self, label_values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for label_values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series[:-2] + [series[-1] - sum(series[:-2])]):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                labels = _format_labels(self.labels + ('le',), label_values + (le,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {series[-2]}")
+            lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+class _Timer:
+    def __init__(self, histogram, label_values):
+        self.histogram, self.label_values = histogram, label_values
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.label_values)
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, *args, **kwargs):
+        return self._add(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self._add(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self._add(Histogram(*args, **kwargs))
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+class SamplingProfiler:
+    """Samples every thread's Python stack every `interval` seconds while running.
+
+    `report()` returns collapsed stacks ("outer;inner;leaf count" per line), the
+    input format of flamegraph.pl / speedscope.
+
+    The sampler runs on a real OS thread even under gevent, where a greenlet
+    would only ever find its own stack. There, each sample shows the greenlet
+    the worker is running at that moment (or the hub, when it is idle).
+    """
+
+    def __init__(self):
+        self.stacks = _Tally()
+        self.samples = 0
+        self.interval = None
+        self.running = False
+        self._stopping = False
+
+    def start(self, interval=0.005):
+        if self.running:
+            return False
+        self.stacks.clear()
+        self.samples = 0
+        self.interval = interval
+        self.running, self._stopping = True, False
+        original('_thread', 'start_new_thread')(self._run, (original('_thread', 'get_ident'), original('time', 'sleep')))
+        return True
+
+    def stop(self):
+        if not self.running:
+            return False
+        self._stopping = True
+        while self.running:
+            time.sleep(self.interval)   # cooperative under gevent, unlike waiting on the OS thread
+        return True
+
+    def _run(self, get_ident, sleep):
+        own = get_ident()
+        try:
+            while not self._stopping:
+                sleep(self.interval)
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own:
+                        continue
+                    stack = ';'.join(f"{f.name} ({f.filename.rsplit('/', 1)[-1]}:{f.lineno})"
+                                     for f in traceback.extract_stack(frame))
+                    self.stacks[stack] += 1
+                self.samples += 1
+        finally:
+            self.running = False
+
+    def report(self, limit=200):
+        lines = [f"{stack} {count}" for stack, count in self.stacks.most_common(limit)]
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,427 @@
+import bisect, math, random, secrets
+from array import array
+from functools import lru_cache
+
+# Constants for game costs and values
+WOODCUTTER_COST = 3       # Cost in trees to buy one woodcutter
+EXCHANGE_VALUE = 1        # Victory points gained per woodcutter exchanged
+FOREST_MAX = 100          # Starting (and maximum) number of trees in the forest
+MAX_ROUNDS = 20           # The game ends after this many rounds
+LOG_LIMIT = 1000          # Keep at most this many log messages per game (oldest are dropped)
+LOG_PAGE = 50             # Log messages shown per page on the game board
+
+# Descriptive names for scenario variants
+SCENARIO_NAMES = {
+    1: "Overshoot & Collapse",
+    2: "Hubbert Curve",
+    3: "Sustainable Scenario"
+}
+
+# Actions a player can take on their turn; the ones in AMOUNT_ACTIONS take a number
+PLAYER_ACTIONS = ('harvest', 'replant', 'buy_vp', 'buy_wc', 'exchange', 'end_turn')
+AMOUNT_ACTIONS = ('replant', 'buy_vp', 'buy_wc')
+
+# Why act() rejected an amount
+INVALID_AMOUNT_MESSAGES = {
+    'replant': "Invalid replant amount.",
+    'buy_vp': "Invalid amount for buying VP.",
+    'buy_wc': "Invalid amount for buying woodcutters.",
+}
+
+# Game log events are stored as (kind, *args) tuples and formatted only when displayed or exported
+LOG_FORMATS = {
+    'harvest': "Player {} harvested {} trees (Total harvested: {})",
+    'replant': "Scheduled to replant {} tree(s) (+{} trees next round)",
+    'buy_vp': "Bought {} Victory Point(s)",
+    'buy_wc': "Bought {} Woodcutter(s)",
+    'exchange': "Exchanged 1 Woodcutter for {} VP (Exchanges this round: {})",
+    'round_end': "=== End of Round {} ===",
+    'forest': "Forest now has {} trees",
+    'depleted': "Forest depleted! Game over.",
+    'final_round': "Game reached final round or forest is depleted. Game over.",
+    'final_scores': "Final Scores -> Player 1: {}, Player 2: {}",
+    'hubbert_penalty': "Hubbert variant: woodcutter penalty applied to final scores.",
+}
+
+def format_log_event(event):
+    return LOG_FORMATS[event[0]].format(*event[1:])
+
+# Columns of one round_stats record, in CSV order
+ROUND_FIELDS = ('round', 'trees', 'p1_replanted', 'p2_replanted',
+                'p1_harvested', 'p1_woodcutters', 'p1_vp',
+                'p2_harvested', 'p2_woodcutters', 'p2_vp')
+
+class RoundHistory:
+    """Per-round statistics packed into one flat array of 32-bit ints (len(ROUND_FIELDS) per round).
+
+    Iterating yields one tuple per round with the values in ROUND_FIELDS order.
+    """
+    __slots__ = ('_data',)
+
+    def __init__(self, values=()):
+        self._data = array('i', values)
+
+    def append(self, record):
+        if len(record) != len(ROUND_FIELDS):
+            raise ValueError(f"expected {len(ROUND_FIELDS)} values, got {len(record)}")
+        self._data.extend(record)
+
+    def __len__(self):
+        return len(self._data) // len(ROUND_FIELDS)
+
+    def __getitem__(self, index):
+        width = len(ROUND_FIELDS)
+        index = range(len(self))[index]
+        return tuple(self._data[index * width:(index + 1) * width])
+
+    def __iter__(self):
+        width = len(ROUND_FIELDS)
+        for start in range(0, len(self._data), width):
+            yield tuple(self._data[start:start + width])
+
+    def tolist(self):
+        """Flat list of every value (the serialized form)."""
+        return self._data.tolist()
+
+# Ways one woodcutter's 6-sided die yields 0, 1 or 2 trees (1 -> 0, 2-4 -> 1, 5-6 -> 2)
+DIE_FACES_PER_YIELD = (1, 3, 2)
+
+@lru_cache(maxsize=512)
+def harvest_cumulative(woodcutters):
+    """Exact cumulative distribution of the total yield of `woodcutters` dice.
+
+    Entry t is the number of the 6**woodcutters equally likely roll combinations
+    that yield at most t trees, so a single uniform integer below 6**woodcutters
+    picks a total with exactly the same odds as rolling every die.
+    """
+    zero, one, two = DIE_FACES_PER_YIELD
+    counts = [0] * (2 * woodcutters + 1)
+    for twos in range(woodcutters + 1):
+        for ones in range(woodcutters - twos + 1):
+            ways = math.comb(woodcutters, twos) * math.comb(woodcutters - twos, ones)
+            counts[ones + 2 * twos] += ways * one ** ones * two ** twos * zero ** (woodcutters - twos - ones)
+    cumulative = []
+    total = 0
+    for count in counts:
+        total += count
+        cumulative.append(total)
+    return tuple(cumulative)
+
+class Player:
+    __slots__ = ('woodcutters', 'victory_points', 'harvested_trees', 'replanted',
+                 'exchanges_this_round', 'has_harvested', 'total_vp_gained')
+
+    def __init__(self):
+        self.woodcutters = 1
+        self.victory_points = 0
+        self.harvested_trees = 0
+        self.replanted = 0
+        self.exchanges_this_round = 0
+        self.has_harvested = False
+        self.total_vp_gained = 0
+
+    def to_dict(self):
+        """Plain-dict form of the player's state (used by the game store)."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        player = cls()
+        for key, value in data.items():
+            setattr(player, key, value)
+        return player
+
+class GameModel:
+    __slots__ = ('players', 'forest', 'current_round', 'variant', 'current_player', 'game_over',
+                 'replant_buffer', 'players_info', 'round_stats', 'log_events', 'log_dropped', 'seed', 'draws',
+                 'version', 'field_versions', 'log_versions')
+
+    def __init__(self, variant, players_info, seed=None):
+        self.players = [Player(), Player()]
+        self.forest = FOREST_MAX
+        self.current_round = 0
+        self.variant = variant                # 1, 2, or 3 (scenario variant)
+        self.current_player = 0              # 0 = Player1's turn, 1 = Player2's turn
+        self.game_over = False
+        self.replant_buffer = 0             # trees scheduled to grow next round from replanting
+        self.players_info = players_info    # list of player info dictionaries
+        self.round_stats = RoundHistory()  # history of each round's stats (for CSV log)
+        self.log_events = []               # event log for the game as (kind, *args) tuples, see log()
+        self.log_dropped = 0               # events dropped from the front of log_events
+        self.seed = secrets.randbits(64) if seed is None else seed   # replaying a seed reproduces every harvest
+        self.draws = 0                     # random draws made so far from this game's generator
+        self.version = 0                   # bumped by every accepted action
+        self.field_versions = {}           # snapshot() key -> version that last changed it
+        self.log_versions = array('I')     # version that added each entry of log_events
+
+    def to_dict(self):
+        """Plain-dict (JSON-serializable) form of the whole game state."""
+        data = {name: getattr(self, name) for name in GameModel.__slots__}
+        data['players'] = [player.to_dict() for player in self.players]
+        data['round_stats'] = self.round_stats.tolist()
+        data['log_versions'] = self.log_versions.tolist()
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a GameModel from the output of `to_dict`."""
+        model = cls(data['variant'], data['players_info'], seed=data['seed'])
+        for key, value in data.items():
+            if key not in ('players', 'round_stats', 'log_events', 'log_versions'):
+                setattr(model, key, value)
+        model.players = [Player.from_dict(p) for p in data['players']]
+        model.field_versions = dict(data['field_versions'])   # a copy() must not mark the original's fields
+        model.round_stats = RoundHistory(data['round_stats'])
+        model.log_events = [tuple(event) for event in data['log_events']]
+        model.log_versions = array('I', data['log_versions'])
+        return model
+
+    def copy(self):
+        """Independent copy of the game (used to apply a batch of actions all-or-nothing)."""
+        return GameModel.from_dict(self.to_dict())
+
+    @property
+    def log_messages(self):
+        """The game log as display strings (formatted on each access)."""
+        return [format_log_event(event) for event in self.log_events]
+
+    def log_page(self, page=0, size=LOG_PAGE):
+        """One page of the log as display strings, oldest first; page 0 holds the newest `size` messages.
+        Returns (messages, page, pages) with `page` clamped to the pages there are. Formats only that page."""
+        total = len(self.log_events)
+        pages = max(1, -(-total // size))
+        page = min(max(page, 0), pages - 1)
+        stop = total - page * size
+        return [format_log_event(event) for event in self.log_events[max(stop - size, 0):stop]], page, pages
+
+    def random_draw(self, n):
+        """Uniform integer in [0, n) from this game's own generator."""
+        # Keyed by (seed, draw number) rather than a stored generator state, so the model stays small
+        # and serializable while a replay from the same seed gets bit-for-bit the same draws
+        rng = random.Random(f"{self.seed}:{self.draws}")
+        self.draws += 1
+        return rng.randrange(n)
+
+    def log(self, kind, *args):
+        """Append a LOG_FORMATS event to the game log, keeping only the newest LOG_LIMIT events."""
+        self.log_events.append((kind,) + args)
+        self.log_versions.append(self.version + 1)   # the version the action being applied will publish
+        if len(self.log_events) > LOG_LIMIT:
+            # Trim in chunks so a long game does not pay for a list shift on every event
+            excess = len(self.log_events) - LOG_LIMIT + LOG_LIMIT // 10
+            del self.log_events[:excess]
+            del self.log_versions[:excess]
+            self.log_dropped += excess
+
+    def roll_harvest(self, woodcutters):
+        """Roll the dice for `woodcutters` woodcutters. Returns the total yield before the forest cap."""
+        # One draw from the exact distribution of the dice total instead of one roll per woodcutter
+        cumulative = harvest_cumulative(woodcutters)
+        return bisect.bisect_right(cumulative, self.random_draw(cumulative[-1]))
+
+    def harvest(self):
+        """Perform a harvest action for the current player. Returns number of trees harvested."""
+        player = self.players[self.current_player]
+        total_harvest = self.roll_harvest(player.woodcutters)
+        actual_harvest = min(total_harvest, self.forest)  # cannot harvest more trees than remain
+        self.forest -= actual_harvest
+        player.harvested_trees += actual_harvest
+        player.has_harvested = True
+        return actual_harvest
+
+    def replant(self, amount):
+        """Schedule replanting of `amount` harvested trees (3 new trees next round per tree)."""
+        player = self.players[self.current_player]
+        max_possible = min(player.harvested_trees, (FOREST_MAX - self.forest - self.replant_buffer) // 3)
+        if amount <= max_possible:
+            player.harvested_trees -= amount
+            player.replanted += amount
+            self.replant_buffer += amount * 3  # these trees will regrow next round
+            return True
+        return False
+
+    def buy_vp(self, amount):
+        """Convert harvested trees to Victory Points (2 trees = 1 VP)."""
+        player = self.players[self.current_player]
+        max_possible = player.harvested_trees // 2
+        if amount <= max_possible:
+            player.victory_points += amount
+            player.total_vp_gained += amount
+            player.harvested_trees -= amount * 2
+            return True
+        return False
+
+    def buy_wc(self, amount):
+        """Buy additional woodcutters (3 trees = 1 woodcutter)."""
+        player = self.players[self.current_player]
+        max_possible = player.harvested_trees // WOODCUTTER_COST
+        if amount <= max_possible:
+            player.woodcutters += amount
+            player.harvested_trees -= amount * WOODCUTTER_COST
+            return True
+        return False
+
+    def exchange_wc(self):
+        """Exchange one woodcutter for victory points (limited to 2 exchanges per round)."""
+        player = self.players[self.current_player]
+        if player.woodcutters > 1 and player.exchanges_this_round < 2:
+            player.woodcutters -= 1
+            player.victory_points += EXCHANGE_VALUE
+            player.total_vp_gained += EXCHANGE_VALUE
+            player.exchanges_this_round += 1
+            return "exchanged"
+        elif player.exchanges_this_round >= 2:
+            return "limit"   # already exchanged twice this round
+        else:
+            return "min_wc"  # cannot exchange because only 1 woodcutter left
+
+    def act(self, player_idx, action, amount=0):
+        """Apply one action for `player_idx` with the web game's rules, logging it.
+
+        Returns None on success or the message to show the player when the action is refused.
+        Every accepted action bumps `version` and records which snapshot fields it changed.
+        The new version is published last, so a reader without the game lock never pairs it
+        with a state the action has not finished changing.
+        """
+        before = self.snapshot()
+        error = self._apply(player_idx, action, amount)
+        if error:
+            return error   # refused actions change nothing
+        version = self.version + 1
+        for key, value in self.snapshot().items():
+            if before[key] != value:
+                self.field_versions[key] = version
+        self.version = version
+        return None
+
+    def changes_since(self, version):
+        """Snapshot fields changed after `version` and the log messages added after it.
+
+        The third value is True when log entries from after `version` have already been trimmed.
+        """
+        state = self.snapshot()
+        changes = {key: state[key] for key, changed in self.field_versions.items() if changed > version}
+        start = bisect.bisect_right(self.log_versions, version)
+        truncated = start == 0 and self.log_dropped > 0
+        return changes, [format_log_event(event) for event in self.log_events[start:]], truncated
+
+    def _apply(self, player_idx, action, amount):
+        if action not in PLAYER_ACTIONS:
+            return f"Unknown action: {action}"
+        if self.game_over:
+            return "The game is over."
+        player = self.players[player_idx]
+        if action == 'harvest':
+            # Only allow if it's this player's turn
+            if player_idx != self.current_player:
+                return "Not your turn."
+            if player.has_harvested:
+                return "You have already harvested this turn."
+            harvested = self.harvest()
+            self.log('harvest', player_idx + 1, harvested, player.harvested_trees)
+            # If harvest depleted the forest, end game immediately
+            if self.forest <= 0:
+                self.end_game()
+                self.game_over = True
+                self.log_final_scores('depleted')
+            return None
+        # Everything else needs it to be this player's turn and a harvest already done this turn
+        if player_idx != self.current_player or not player.has_harvested:
+            return "Cannot end turn before harvesting." if action == 'end_turn' else "Action not allowed."
+        if action in AMOUNT_ACTIONS:
+            if amount < 0 or not getattr(self, action)(amount):
+                return INVALID_AMOUNT_MESSAGES[action]
+            if action == 'replant':
+                self.log('replant', amount, amount * 3)
+            else:
+                self.log(action, amount)
+        elif action == 'exchange':
+            result = self.exchange_wc()
+            if result == "limit":
+                return "You can only exchange 2 woodcutters per round."
+            if result == "min_wc":
+                return "You must keep at least 1 woodcutter."
+            self.log('exchange', EXCHANGE_VALUE, player.exchanges_this_round)
+        elif self.end_turn():
+            self.log('round_end', self.current_round)
+            self.log('forest', self.forest)
+            # If the game ended due to round limit or forest depletion at this point
+            if self.game_over:
+                self.end_game()
+                self.log_final_scores('final_round')
+        return None
+
+    def log_final_scores(self, reason):
+        self.log(reason)
+        self.log('final_scores', self.players[0].victory_points, self.players[1].victory_points)
+        if self.variant == 2:
+            self.log('hubbert_penalty')
+
+    def snapshot(self):
+        """Public board state as a flat dict ('players.0.woodcutters' style keys for player fields)."""
+        state = {'forest': self.forest, 'current_round': self.current_round, 'current_player': self.current_player,
+                 'game_over': self.game_over, 'replant_buffer': self.replant_buffer,
+                 'log_length': self.log_dropped + len(self.log_events)}
+        for index, player in enumerate(self.players):
+            for name in Player.__slots__:
+                state[f'players.{index}.{name}'] = getattr(player, name)
+        return state
+
+    def end_turn(self):
+        """End the current player's turn. Returns True if this completed a round (Player 2 just finished)."""
+        self.players[self.current_player].has_harvested = False
+        # Switch active player (0 -> 1 or 1 -> 0)
+        self.current_player = 1 - self.current_player
+        if self.current_player == 0:
+            self.current_round += 1
+            self.end_round()
+            return True
+        return False
+
+    def end_round(self):
+        """Handle end-of-round updates: replant growth and scenario-specific effects."""
+        # Grow trees from replanting (up to forest max 100)
+        self.forest = min(self.forest + self.replant_buffer, FOREST_MAX)
+        # Record round statistics for logging
+        p1, p2 = self.players
+        self.round_stats.append((self.current_round, self.forest, p1.replanted, p2.replanted,
+                                 p1.harvested_trees, p1.woodcutters, p1.victory_points,
+                                 p2.harvested_trees, p2.woodcutters, p2.victory_points))
+        # Reset per-round replant and exchange counters
+        self.replant_buffer = 0
+        for player in self.players:
+            player.replanted = 0
+            player.exchanges_this_round = 0
+        # Sustainable Scenario (variant 3): bonus VPs every 5 rounds (based on 10% of forest)
+        if self.variant == 3 and self.current_round % 5 == 0:
+            bonus = self.forest // 10
+            for player in self.players:
+                player.victory_points += bonus
+                player.total_vp_gained += bonus
+        # Check end-game conditions: forest depletion or reaching round 20
+        if self.forest <= 0 or self.current_round >= MAX_ROUNDS:
+            self.game_over = True
+
+    def end_game(self):
+        """Apply final game rules at game over: convert leftover trees to VPs, apply penalties/bonuses, determine winner."""
+        # Convert remaining harvested trees to victory points (2 trees -> 1 VP)
+        for player in self.players:
+            if player.harvested_trees > 0:
+                vp_gained = player.harvested_trees // 2
+                player.victory_points += vp_gained
+                player.total_vp_gained += vp_gained
+                player.harvested_trees = 0
+        # Hubbert Curve scenario (variant 2): apply penalty of -1 VP per extra woodcutter beyond the first
+        if self.variant == 2:
+            for player in self.players:
+                penalty = max(0, player.woodcutters - 1)
+                player.victory_points -= penalty
+        # Determine winner (or draw)
+        scores = [self.players[0].victory_points, self.players[1].victory_points]
+        if scores[0] > scores[1]:
+            winner = "Player 1"
+        elif scores[1] > scores[0]:
+            winner = "Player 2"
+        else:
+            winner = "Draw"
+        return scores, winner
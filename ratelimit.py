@@ -0,0 +1,48 @@
+"""In-process token-bucket rate limiter.
+
+Each key (a player's seat in a game, or a client address) gets a bucket that
+holds up to `burst` tokens and refills at `rate` tokens per second. A request
+takes one token; when the bucket is empty it is refused and told how long to
+wait for the next token.
+
+    limiter = RateLimiter(rate=5, burst=20)
+    wait = limiter.acquire(('ABC123', 0, '10.0.0.7'))
+    if wait:
+        ...   # answer 429 with Retry-After: ceil(wait)
+
+Buckets live in this worker's memory (each gunicorn worker limits on its own).
+At most `max_keys` buckets are kept; the least recently used is dropped first,
+which only forgets a client that has been quiet the longest.
+"""
+import threading, time
+from collections import OrderedDict
+
+class RateLimiter:
+    def __init__(self, rate, burst, max_keys=50000, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = OrderedDict()   # key -> [tokens, time of last update]
+        self._lock = threading.Lock()
+
+    def acquire(self, key, cost=1):
+        """Take `cost` tokens for `key`. Returns 0 if allowed, else the seconds until they are available."""
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now]
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return 0
+            return (cost - bucket[0]) / self.rate
+
+    def __len__(self):
+        return len(self._buckets)
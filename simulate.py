@@ -0,0 +1,275 @@
+"""Vectorized batch simulation of the forest game (research tool, requires numpy).
+
+Plays many games at once with the same rules as `GameModel`. Every quantity is
+a NumPy array with one entry per game, so a batch of a million games costs
+about the same number of Python-level steps as a single game.
+
+A policy is a callback `policy(state, player, rng)` called once per turn, after
+the harvest, for the given player (0 or 1). It returns a dict of int arrays of
+length `state.n` with any of the keys 'replant', 'buy_vp', 'buy_wc' and
+'exchange' (missing keys mean 0). The amounts are applied in that order, like
+a player pressing the buttons one after another; an amount the model would
+reject (more than `GameModel.replant/buy_vp/buy_wc` allow, or negative) is
+skipped, and 'exchange' asks for up to that many `exchange_wc` calls.
+
+    python simulate.py --variant 2 --games 1000000 --policy greedy
+    python simulate.py --check          # compare against GameModel, game by game
+"""
+import argparse, time
+
+import numpy as np
+
+from models import GameModel, SCENARIO_NAMES, WOODCUTTER_COST, EXCHANGE_VALUE, FOREST_MAX, MAX_ROUNDS
+
+# Per-woodcutter die outcome probabilities: P(2 trees) = 2/6, P(1 tree | not 2) = (3/6) / (4/6)
+P_TWO = 2 / 6
+P_ONE_GIVEN_NOT_TWO = 3 / 4
+
+ACTIONS = ('replant', 'buy_vp', 'buy_wc', 'exchange')
+
+class BatchState:
+    """State of `n` games. Per-player arrays have shape (2, n), so each player's row is contiguous."""
+
+    def __init__(self, n, variant):
+        self.n = n
+        self.variant = variant
+        self.forest = np.full(n, FOREST_MAX, dtype=np.int64)
+        self.current_round = np.zeros(n, dtype=np.int64)
+        self.replant_buffer = np.zeros(n, dtype=np.int64)
+        self.game_over = np.zeros(n, dtype=bool)
+        self.collapsed = np.zeros(n, dtype=bool)          # game ended because the forest ran out
+        self.woodcutters = np.ones((2, n), dtype=np.int64)
+        self.victory_points = np.zeros((2, n), dtype=np.int64)
+        self.harvested_trees = np.zeros((2, n), dtype=np.int64)
+        self.replanted = np.zeros((2, n), dtype=np.int64)
+        self.exchanges_this_round = np.zeros((2, n), dtype=np.int64)
+        self.total_vp_gained = np.zeros((2, n), dtype=np.int64)
+
+    def roll_harvest(self, woodcutters, rng):
+        """Total dice yield for each game (before the forest cap)."""
+        twos = rng.binomial(woodcutters, P_TWO)
+        ones = rng.binomial(woodcutters - twos, P_ONE_GIVEN_NOT_TWO)
+        return 2 * twos + ones
+
+    def harvest(self, p, active, rolls):
+        actual = np.where(active, np.minimum(rolls, self.forest), 0)
+        self.forest -= actual
+        self.harvested_trees[p] += actual
+        return actual
+
+    def apply(self, p, active, decision):
+        """Apply a policy decision for player `p` in the active games (same checks as GameModel)."""
+        harvested = self.harvested_trees[p]
+        amount = _amount(decision, 'replant', active)
+        ok = (amount >= 0) & (amount <= np.minimum(harvested, (FOREST_MAX - self.forest - self.replant_buffer) // 3))
+        amount = np.where(ok, amount, 0)
+        harvested -= amount
+        self.replanted[p] += amount
+        self.replant_buffer += amount * 3
+
+        amount = _amount(decision, 'buy_vp', active)
+        amount = np.where((amount >= 0) & (amount <= harvested // 2), amount, 0)
+        self.victory_points[p] += amount
+        self.total_vp_gained[p] += amount
+        harvested -= amount * 2
+
+        amount = _amount(decision, 'buy_wc', active)
+        amount = np.where((amount >= 0) & (amount <= harvested // WOODCUTTER_COST), amount, 0)
+        self.woodcutters[p] += amount
+        harvested -= amount * WOODCUTTER_COST
+
+        wanted = _amount(decision, 'exchange', active)
+        allowed = np.minimum(2 - self.exchanges_this_round[p], self.woodcutters[p] - 1)
+        amount = np.clip(np.minimum(wanted, allowed), 0, None)
+        self.woodcutters[p] -= amount
+        self.victory_points[p] += amount * EXCHANGE_VALUE
+        self.total_vp_gained[p] += amount * EXCHANGE_VALUE
+        self.exchanges_this_round[p] += amount
+
+    def end_round(self, active):
+        self.current_round += active
+        self.forest = np.where(active, np.minimum(self.forest + self.replant_buffer, FOREST_MAX), self.forest)
+        self.replant_buffer[active] = 0
+        self.replanted[:, active] = 0
+        self.exchanges_this_round[:, active] = 0
+        # Sustainable Scenario (variant 3): bonus VPs every 5 rounds (based on 10% of forest)
+        if self.variant == 3:
+            bonus = np.where(active & (self.current_round % 5 == 0), self.forest // 10, 0)
+            self.victory_points += bonus
+            self.total_vp_gained += bonus
+        return active & ((self.forest <= 0) | (self.current_round >= MAX_ROUNDS))
+
+    def end_game(self, ending):
+        """Final scoring (GameModel.end_game) for the games in the `ending` mask."""
+        if not ending.any():
+            return
+        leftover = np.where(ending, self.harvested_trees // 2, 0)
+        self.victory_points += leftover
+        self.total_vp_gained += leftover
+        self.harvested_trees[:, ending] = 0
+        # Hubbert Curve scenario (variant 2): -1 VP per extra woodcutter beyond the first
+        if self.variant == 2:
+            self.victory_points -= np.where(ending, np.maximum(self.woodcutters - 1, 0), 0)
+        self.game_over |= ending
+
+    def winners(self):
+        """0 / 1 for a Player 1 / Player 2 win, -1 for a draw."""
+        vp = self.victory_points
+        return np.where(vp[0] > vp[1], 0, np.where(vp[1] > vp[0], 1, -1))
+
+def _amount(decision, key, active):
+    amount = decision.get(key)
+    if amount is None:
+        return 0
+    return np.where(active, np.asarray(amount, dtype=np.int64), 0)
+
+def run_batch(n_games, variant, policy, seed=None, trace=False):
+    """Play `n_games` games of `variant` with `policy` controlling both players.
+
+    Returns the final BatchState. With trace=True the state also carries
+    `trace`: a list with one (player, rolls, decision) tuple per turn, used by
+    `check_equivalence` to replay the same games through GameModel.
+    """
+    rng = np.random.default_rng(seed)
+    state = BatchState(n_games, variant)
+    state.trace = [] if trace else None
+    for _ in range(MAX_ROUNDS):
+        for p in (0, 1):
+            active = ~state.game_over
+            if not active.any():
+                return state
+            rolls = state.roll_harvest(state.woodcutters[p], rng)
+            state.harvest(p, active, rolls)
+            # A harvest that empties the forest ends the game on the spot (see the /harvest handler)
+            depleted = active & (state.forest <= 0)
+            state.collapsed |= depleted
+            state.end_game(depleted)
+            active &= ~depleted
+            decision = policy(state, p, rng)
+            state.apply(p, active, decision)
+            if trace:
+                state.trace.append((p, rolls, {k: np.asarray(decision.get(k, 0)) for k in ACTIONS}))
+        ending = state.end_round(~state.game_over)
+        state.collapsed |= ending & (state.forest <= 0)
+        state.end_game(ending)
+    return state
+
+# --- Example policies ---
+
+def greedy_policy(state, p, rng):
+    """Turn every harvested tree into victory points."""
+    return {'buy_vp': state.harvested_trees[p] // 2}
+
+def expansion_policy(state, p, rng):
+    """Hire woodcutters during the first half, then cash in."""
+    early = state.current_round < MAX_ROUNDS // 2
+    trees = state.harvested_trees[p]
+    return {'buy_wc': np.where(early, trees // WOODCUTTER_COST, 0),
+            'buy_vp': np.where(early, 0, trees // 2)}
+
+def sustainable_policy(state, p, rng):
+    """Replant to keep the forest full, sell the rest."""
+    trees = state.harvested_trees[p]
+    replant = np.minimum(trees, (FOREST_MAX - state.forest - state.replant_buffer) // 3)
+    return {'replant': replant, 'buy_vp': (trees - replant) // 2}
+
+def random_policy(state, p, rng):
+    """Uniformly random (possibly invalid) amounts; useful for exercising every rule."""
+    trees = state.harvested_trees[p]
+    return {'replant': rng.integers(0, trees + 2), 'buy_vp': rng.integers(0, trees // 2 + 2),
+            'buy_wc': rng.integers(0, trees // 3 + 2), 'exchange': rng.integers(0, 3, size=state.n)}
+
+POLICIES = {
+    'greedy': greedy_policy,
+    'expansion': expansion_policy,
+    'sustainable': sustainable_policy,
+    'random': random_policy,
+}
+
+# --- Equivalence with the scalar model ---
+
+class _ReplayModel(GameModel):
+    """GameModel whose dice return pre-recorded totals."""
+
+    def roll_harvest(self, woodcutters):
+        return next(self.rolls)
+
+def play_scalar(variant, rolls, decisions):
+    """Drive one GameModel through GameModel.act, the same code path as the web app's action handlers."""
+    model = _ReplayModel(variant, [{}, {}])
+    model.rolls = iter(rolls)
+    for decision in decisions:
+        if model.game_over:
+            break
+        player = model.current_player
+        model.act(player, 'harvest')
+        # Refused actions (out of range, negative, over the exchange limit) change nothing, as in BatchState.apply
+        for action in ('replant', 'buy_vp', 'buy_wc'):
+            model.act(player, action, decision[action])
+        for _ in range(decision['exchange']):
+            model.act(player, 'exchange')
+        model.act(player, 'end_turn')
+    return model
+
+def check_equivalence(n_games=2000, seed=0, policy=random_policy):
+    """Play `n_games` per variant in batch, replay each through GameModel and compare final states.
+
+    Returns the number of mismatching games (0 means the engines agree).
+    """
+    mismatches = 0
+    for variant in SCENARIO_NAMES:
+        state = run_batch(n_games, variant, policy, seed=seed, trace=True)
+        for g in range(n_games):
+            rolls, decisions = [], []
+            for p, turn_rolls, decision in state.trace:
+                rolls.append(int(turn_rolls[g]))
+                decisions.append({k: int(np.broadcast_to(v, (n_games,))[g]) for k, v in decision.items()})
+            model = play_scalar(variant, rolls, decisions)
+            expected = (model.forest, model.current_round, model.game_over,
+                        [pl.victory_points for pl in model.players], [pl.woodcutters for pl in model.players],
+                        [pl.total_vp_gained for pl in model.players])
+            actual = (int(state.forest[g]), int(state.current_round[g]), bool(state.game_over[g]),
+                      state.victory_points[:, g].tolist(), state.woodcutters[:, g].tolist(),
+                      state.total_vp_gained[:, g].tolist())
+            if expected != actual:
+                mismatches += 1
+                print(f"variant {variant} game {g}: GameModel {expected} != batch {actual}")
+    return mismatches
+
+def summarize(state):
+    vp = state.victory_points
+    winners = state.winners()
+    return {
+        'games': state.n,
+        'mean_vp': vp.mean(axis=1).round(2).tolist(),
+        'std_vp': vp.std(axis=1).round(2).tolist(),
+        'p1_win_rate': round(float((winners == 0).mean()), 4),
+        'p2_win_rate': round(float((winners == 1).mean()), 4),
+        'draw_rate': round(float((winners == -1).mean()), 4),
+        'collapse_rate': round(float(state.collapsed.mean()), 4),
+        'mean_rounds': round(float(state.current_round.mean()), 2),
+        'mean_final_forest': round(float(state.forest.mean()), 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch-simulate forest games with NumPy.")
+    parser.add_argument('--variant', type=int, choices=sorted(SCENARIO_NAMES), default=1)
+    parser.add_argument('--games', type=int, default=100000)
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='greedy')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--check', action='store_true', help="compare the batch engine against GameModel")
+    args = parser.parse_args()
+    if args.check:
+        mismatches = check_equivalence(seed=args.seed or 0)
+        print("OK: batch engine matches GameModel" if not mismatches else f"{mismatches} mismatching games")
+        raise SystemExit(1 if mismatches else 0)
+    start = time.perf_counter()
+    state = run_batch(args.games, args.variant, POLICIES[args.policy], seed=args.seed)
+    elapsed = time.perf_counter() - start
+    print(f"{SCENARIO_NAMES[args.variant]} / {args.policy}: {args.games} games in {elapsed:.2f}s "
+          f"({args.games / elapsed * 60:,.0f} games/min)")
+    for key, value in summarize(state).items():
+        print(f"  {key}: {value}")
+
+if __name__ == '__main__':
+    main()
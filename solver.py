@@ -0,0 +1,227 @@
+"""Offline optimal-policy solver and the hint / regret lookups built on it (requires numpy).
+
+Solves one player's game by backward induction for each variant and seat.
+The state space is discretized: at the start of a turn the state is
+(rounds played, forest, woodcutters, carried tree, opponent woodcutters), with
+woodcutters capped at W_MAX and opponent woodcutters at O_MAX. The other
+player is approximated by its expected harvest (7/6 tree per woodcutter, no
+replanting), and the player banks every tree it does not spend as victory
+points. The decision after each harvest is (buy_wc, replant, exchange).
+
+Tables are written as .npy files and memory-mapped when a hint is asked for,
+so a hint is a couple of array lookups with no search:
+
+    python solver.py --out policy          # solve all variants (a few seconds)
+
+    policy/v<variant>_p<seat>_value.npy    V[round, forest, woodcutters-1, carry, opponent-1]
+    policy/v<variant>_p<seat>_action.npy   best plan code A[round, forest, woodcutters-1, trees, opponent-1]
+"""
+import argparse, os, time
+
+import numpy as np
+
+from models import harvest_cumulative, SCENARIO_NAMES, WOODCUTTER_COST, EXCHANGE_VALUE, FOREST_MAX, MAX_ROUNDS
+
+W_MAX = 10                     # woodcutters tracked (more are treated as W_MAX)
+O_MAX = 6                      # opponent woodcutters tracked
+T_MAX = 2 * W_MAX + 1          # most trees in hand after a harvest (2 per woodcutter plus a carried one)
+REPLANT_CODES = T_MAX + 1
+MEAN_TREES_PER_WOODCUTTER = 7 / 6
+NO_ACTION = -1
+
+DEFAULT_DIR = os.environ.get('POLICY_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'policy'))
+
+def encode_plan(buy, replant, exchange):
+    return (buy * REPLANT_CODES + replant) * 3 + exchange
+
+def decode_plan(code):
+    rest, exchange = divmod(int(code), 3)
+    buy, replant = divmod(rest, REPLANT_CODES)
+    return buy, replant, exchange
+
+def harvest_probabilities(woodcutters):
+    """Probability of each dice total 0..2*woodcutters, from the exact cumulative table."""
+    cumulative = np.array(harvest_cumulative(woodcutters), dtype=np.float64)
+    return np.diff(cumulative, prepend=0) / cumulative[-1]
+
+def opponent_harvest(opponent_idx):
+    return np.rint(MEAN_TREES_PER_WOODCUTTER * (np.asarray(opponent_idx) + 1)).astype(np.int64)
+
+def end_value(variant, woodcutters_idx):
+    """Points added at game over with no trees in hand: the Hubbert penalty."""
+    return -np.asarray(woodcutters_idx) if variant == 2 else np.zeros_like(woodcutters_idx)
+
+def after_turn(variant, seat, value_next, rnd, forest, buffer, woodcutters_idx, carry, opponent_idx):
+    """Expected points still to come after a turn ended with these values (arrays broadcast together).
+
+    Plays out the other player's expected harvest and the round end in seat order, like GameModel.
+    `value_next` is V[rnd + 1] (ignored when the game ends at this round).
+    """
+    forest = np.asarray(forest)
+    finish = end_value(variant, woodcutters_idx) + carry // 2
+    taken_by = opponent_harvest(opponent_idx)
+    next_round = rnd + 1
+    if seat == 0:
+        # The other player (Player 2) harvests, then the round ends
+        left = forest - np.minimum(taken_by, forest)
+        grown = np.minimum(left + buffer, FOREST_MAX)
+        bonus = grown // 10 if variant == 3 and next_round % 5 == 0 else 0
+        if next_round >= MAX_ROUNDS:
+            return np.where(left <= 0, finish, bonus + finish)
+        later = value_next[np.minimum(grown, FOREST_MAX), woodcutters_idx, carry, opponent_idx]
+        return np.where(left <= 0, finish, bonus + later)
+    # Our end_turn closes the round, then the other player (Player 1) harvests
+    grown = np.minimum(forest + buffer, FOREST_MAX)
+    bonus = grown // 10 if variant == 3 and next_round % 5 == 0 else 0
+    if next_round >= MAX_ROUNDS:
+        return bonus + finish
+    left = grown - np.minimum(taken_by, grown)
+    later = value_next[np.maximum(left, 0), woodcutters_idx, carry, opponent_idx]
+    return np.where(left <= 0, bonus + finish, bonus + later)
+
+def plan_options():
+    """Every (buy, replant, exchange) the solver considers. Buying and exchanging in one turn never pays."""
+    for buy in range(T_MAX // WOODCUTTER_COST + 1):
+        for replant in range(T_MAX - buy * WOODCUTTER_COST + 1):
+            if 3 * replant > FOREST_MAX:
+                break
+            for exchange in ((0, 1, 2) if buy == 0 else (0,)):
+                yield buy, replant, exchange
+
+def solve(variant, seat):
+    """Backward induction for one variant and seat. Returns (V, A) as described in the module docstring."""
+    F = FOREST_MAX + 1
+    value = np.zeros((MAX_ROUNDS, F, W_MAX, 2, O_MAX), dtype=np.float32)
+    action = np.full((MAX_ROUNDS, F, W_MAX, T_MAX + 1, O_MAX), NO_ACTION, dtype=np.int16)
+    forest = np.arange(F)[:, None, None, None]
+    w_idx = np.arange(W_MAX)[None, :, None, None]
+    carry = np.arange(2)[None, None, :, None]
+    o_idx = np.arange(O_MAX)[None, None, None, :]
+    trees = np.arange(T_MAX + 1)
+    for rnd in range(MAX_ROUNDS - 1, -1, -1):
+        value_next = value[rnd + 1] if rnd + 1 < MAX_ROUNDS else None
+        # Value after ending the turn, per number of trees replanted this turn: [replant][forest, w, carry, o]
+        cont = [np.broadcast_to(after_turn(variant, seat, value_next, rnd, forest, 3 * replant, w_idx, carry, o_idx),
+                                (F, W_MAX, 2, O_MAX)) for replant in range(REPLANT_CODES)]
+        # Best decision for each (forest after harvest, woodcutters, trees in hand, opponent)
+        best = np.full((F, W_MAX, T_MAX + 1, O_MAX), -np.inf)
+        best_code = action[rnd]
+        for buy, replant, exchange in plan_options():
+            shift = buy - exchange
+            lo, hi = exchange, W_MAX - max(shift, 0)       # woodcutter rows where the plan is legal
+            spend = buy * WOODCUTTER_COST + replant
+            rows = FOREST_MAX + 1 - 3 * replant             # replanting needs room: forest <= 100 - 3 * replant
+            if lo >= hi or rows <= 0:
+                continue
+            left = trees[spend:] - spend
+            candidate = (cont[replant][:rows, lo + shift:hi + shift][:, :, left % 2, :]
+                         + (left // 2 + exchange * EXCHANGE_VALUE)[None, None, :, None])
+            target = best[:rows, lo:hi, spend:, :]
+            better = candidate > target
+            target[better] = candidate[better]
+            best_code[:rows, lo:hi, spend:, :][better] = encode_plan(buy, replant, exchange)
+        # Expected value before the harvest
+        for w in range(W_MAX):
+            probabilities = harvest_probabilities(w + 1)
+            total = np.zeros((F, 2, O_MAX))
+            for harvested, p in enumerate(probabilities):
+                if p == 0:
+                    continue
+                taken = np.minimum(harvested, np.arange(F))
+                left = np.arange(F) - taken
+                for c in range(2):
+                    in_hand = c + taken
+                    depleted = (in_hand // 2 + end_value(variant, w))[:, None]
+                    chosen = best[left, w, np.minimum(in_hand, T_MAX), :]
+                    total[:, c, :] += p * np.where((left <= 0)[:, None], depleted, chosen)
+            value[rnd, :, w] = total
+    return value, action
+
+def table_path(directory, variant, seat, kind):
+    return os.path.join(directory, f"v{variant}_p{seat}_{kind}.npy")
+
+def write_tables(directory=DEFAULT_DIR, variants=None):
+    os.makedirs(directory, exist_ok=True)
+    for variant in variants or sorted(SCENARIO_NAMES):
+        for seat in (0, 1):
+            start = time.perf_counter()
+            value, action = solve(variant, seat)
+            np.save(table_path(directory, variant, seat, 'value'), value)
+            np.save(table_path(directory, variant, seat, 'action'), action)
+            print(f"{SCENARIO_NAMES[variant]}, Player {seat + 1}: solved in {time.perf_counter() - start:.1f}s, "
+                  f"expected {value[0, FOREST_MAX, 0, 0, 0]:.1f} points from the opening")
+
+class Policy:
+    """Memory-mapped solver tables, loaded on first use."""
+
+    def __init__(self, directory=DEFAULT_DIR):
+        self.directory = directory
+        self._tables = {}
+
+    def available(self):
+        return all(os.path.exists(table_path(self.directory, variant, seat, kind))
+                   for variant in SCENARIO_NAMES for seat in (0, 1) for kind in ('value', 'action'))
+
+    def tables(self, variant, seat):
+        key = (variant, seat)
+        if key not in self._tables:
+            self._tables[key] = (np.load(table_path(self.directory, variant, seat, 'value'), mmap_mode='r'),
+                                 np.load(table_path(self.directory, variant, seat, 'action'), mmap_mode='r'))
+        return self._tables[key]
+
+    def plan_value(self, variant, seat, rnd, forest, woodcutters, trees, opponent, plan, buffer=0):
+        """Points the player can still expect after spending `trees` per `plan`, or None if the plan is not legal.
+
+        `buffer` is the replanting already scheduled this round (`GameModel.replant_buffer`).
+        """
+        buy, replant, exchange = plan
+        spend = buy * WOODCUTTER_COST + replant
+        w = min(woodcutters, W_MAX) + buy - exchange
+        if (min(buy, replant, exchange) < 0 or spend > trees or exchange > 2 or w < 1
+                or replant > (FOREST_MAX - forest - buffer) // 3):
+            return None
+        value, _ = self.tables(variant, seat)
+        value_next = value[rnd + 1] if rnd + 1 < MAX_ROUNDS else None
+        left = trees - spend
+        later = after_turn(variant, seat, value_next, rnd, forest, buffer + 3 * replant,
+                           min(w, W_MAX) - 1, left % 2, min(max(opponent, 1), O_MAX) - 1)
+        return float(left // 2 + exchange * EXCHANGE_VALUE + later)
+
+    def hint(self, model, player_idx, plan=None):
+        """Best plan for a player who has harvested this turn, and the regret of `plan` (buy, replant, exchange)."""
+        player, other = model.players[player_idx], model.players[1 - player_idx]
+        rnd, forest, buffer = model.current_round, model.forest, model.replant_buffer
+        woodcutters, trees = min(player.woodcutters, W_MAX), player.harvested_trees
+        opponent = min(max(other.woodcutters, 1), O_MAX)
+        # Trees carried over from earlier turns can go past T_MAX: look up the plan for T_MAX (or T_MAX - 1, keeping
+        # the parity) and bank the rest as points, which plan_value and buy_vp below count from the real total
+        table_trees = trees if trees <= T_MAX else T_MAX - (trees - T_MAX) % 2
+        _, action = self.tables(model.variant, player_idx)
+        best = decode_plan(action[rnd, forest, woodcutters - 1, table_trees, opponent - 1])
+        # Exchanges already made this round count against the limit of 2
+        best = (best[0], best[1], min(best[2], 2 - player.exchanges_this_round))
+        args = (model.variant, player_idx, rnd, forest, woodcutters, trees, opponent)
+        # The tables assume nothing is replanted yet this round, which only holds for Player 1. When Player 1's
+        # replanting leaves less room, pick the best replant that still fits (buying and exchanging as the table says)
+        room = (FOREST_MAX - forest - buffer) // 3
+        if best[1] > room:
+            best = max(((best[0], replant, best[2]) for replant in range(room + 1)),
+                       key=lambda candidate: self.plan_value(*args, candidate, buffer=buffer))
+        best_value = self.plan_value(*args, best, buffer=buffer)
+        result = {'buy_wc': best[0], 'replant': best[1], 'exchange': best[2],
+                  'buy_vp': (trees - best[0] * WOODCUTTER_COST - best[1]) // 2,
+                  'expected_points': round(player.victory_points + best_value, 2)}
+        if plan is not None:
+            chosen = self.plan_value(*args, plan, buffer=buffer)
+            result['regret'] = None if chosen is None else round(max(best_value - chosen, 0.0), 2)
+        return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve the forest game per variant and write the hint tables.")
+    parser.add_argument('--variant', type=int, choices=sorted(SCENARIO_NAMES), action='append')
+    parser.add_argument('--out', default=DEFAULT_DIR)
+    args = parser.parse_args()
+    write_tables(args.out, args.variant)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,478 @@
+"""Game store backends.
+
+A game entry is the dict created by `/start`:
+    {'p1_info': {...}, 'p2_info': {...} or None, 'variant': int, 'model': GameModel or None}
+plus 'bot': True for single-player games, where the computer is Player 2, and
+'room': the classroom code for lobbies opened by `/play`.
+
+New game codes come from `next_number()`, permuted with the secret
+`code_key()` (see matchmaking.GameCodes), and
+`match_waiting(queue, game_id)` pairs `/play` lobbies: it hands back the lobby
+that has waited longest in the queue, or queues `game_id` when nobody is waiting.
+
+Read-only views use `store.get(game_id)`. Anything that changes a game must go
+through `with store.transaction(game_id) as game:` so the per-game lock is held
+while the entry is loaded, mutated and written back.
+
+Stores are bounded. A game is in one of three states: 'lobby' (waiting for
+Player 2), 'active' or 'finished'. `sweep()` (run periodically by
+`start_sweeper`) drops lobbies idle for `lobby_ttl` seconds, abandoned games
+idle for `idle_ttl`, and finished games once `finished_grace` has passed (long
+enough for players to download their log). Finished games are handed to
+`on_archive(game_id, entry)` before they are dropped, and every evicted game
+is reported to `on_evict(game_id, entry, reason)`. When a new game would
+exceed `capacity`, the least recently used lobby is evicted first, then the
+oldest finished game, then the oldest active one.
+"""
+import json, logging, os, secrets, sqlite3, threading, time
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+
+from models import GameModel, ROUND_FIELDS
+from concurrency import ConnectionPool, blocking
+
+try:
+    import fcntl
+except ImportError:   # not available on Windows; the SQLite write lock still keeps saves atomic
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Eviction order when the store is full
+EVICTION_ORDER = ('lobby', 'finished', 'active')
+
+def encode_entry(entry):
+    """Serialize a game entry (including its GameModel) to a JSON string."""
+    data = dict(entry)
+    if entry['model'] is not None:
+        data['model'] = entry['model'].to_dict()
+    return json.dumps(data, separators=(',', ':'))
+
+def decode_entry(text):
+    """Inverse of `encode_entry`."""
+    data = json.loads(text)
+    if data['model'] is not None:
+        data['model'] = GameModel.from_dict(data['model'])
+    return data
+
+def entry_state(entry):
+    """'lobby', 'active' or 'finished'."""
+    model = entry['model']
+    if model is None:
+        return 'lobby'
+    return 'finished' if model.game_over else 'active'
+
+class GameStore:
+    """Eviction settings and the background sweeper shared by the backends."""
+
+    def __init__(self, capacity=10000, lobby_ttl=3600, idle_ttl=6 * 3600, finished_grace=1800, on_archive=None,
+                 on_evict=None):
+        self.capacity = capacity
+        self.lobby_ttl = lobby_ttl
+        self.idle_ttl = idle_ttl
+        self.finished_grace = finished_grace
+        self.on_archive = on_archive
+        self.on_evict = on_evict
+        self._sweeper = None
+
+    def _expired(self, state, touched, finished, now):
+        """Eviction reason for a game, or None if it should be kept."""
+        if state == 'lobby' and now - touched > self.lobby_ttl:
+            return 'lobby_ttl'
+        if state == 'active' and now - touched > self.idle_ttl:
+            return 'idle_ttl'
+        if state == 'finished' and now - (finished or touched) > self.finished_grace:
+            return 'finished'
+        return None
+
+    def _archive(self, game_id, entry):
+        if self.on_archive is not None and entry_state(entry) == 'finished':
+            try:
+                self.on_archive(game_id, entry)
+            except Exception:
+                logger.exception("Archiving game %s failed", game_id)
+
+    def _evicted_hook(self, game_id, entry, reason):
+        if self.on_evict is not None:
+            try:
+                self.on_evict(game_id, entry, reason)
+            except Exception:
+                logger.exception("Eviction hook for game %s failed", game_id)
+
+    def start_sweeper(self, interval=60):
+        """Run `sweep()` every `interval` seconds in a daemon thread (once per process)."""
+        if self._sweeper is not None:
+            return
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.sweep()
+                except Exception:
+                    logger.exception("Game store sweep failed")
+        self._sweeper = threading.Thread(target=run, name='game-store-sweeper', daemon=True)
+        self._sweeper.start()
+
+class MemoryGameStore(GameStore):
+    """Keeps live entries in a dict of this process. Only safe with a single worker."""
+    shared = False   # other processes cannot see (or change) these games
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self._games = {}
+        self._touched = OrderedDict()   # game_id -> last write time, least recently used first
+        self._finished = {}             # game_id -> time the game was first seen finished
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._evicted = Counter()
+        self._next_number = secrets.randbelow(1 << 30)   # a restart does not replay the previous run's codes
+        self._code_key = secrets.token_bytes(32)
+        self._waiting = {}   # matchmaking queue -> deque of lobby game_ids (only queues with someone in them)
+        self._queued = {}    # game_id -> its matchmaking queue, so deleting a game takes it out of the queue
+
+    def _lock_for(self, game_id):
+        with self._locks_guard:
+            lock = self._locks.get(game_id)
+            if lock is None:
+                lock = self._locks[game_id] = threading.RLock()
+            return lock
+
+    def __contains__(self, game_id):
+        return game_id in self._games
+
+    def __len__(self):
+        return len(self._games)
+
+    def get(self, game_id):
+        return self._games.get(game_id)
+
+    def add(self, game_id, entry):
+        """Insert a new entry. Returns False if the id is already taken."""
+        with self._locks_guard:
+            if game_id in self._games:
+                return False
+            victim = self._pick_victim() if len(self._games) >= self.capacity else None
+            self._games[game_id] = entry
+            self._touched[game_id] = time.time()
+        if victim is not None:
+            self._evict(victim, 'capacity')
+        return True
+
+    def _pick_victim(self):
+        # Least recently used game of the cheapest state to lose (caller holds _locks_guard)
+        for state in EVICTION_ORDER:
+            for game_id in self._touched:
+                if entry_state(self._games[game_id]) == state:
+                    return game_id
+        return None
+
+    def delete(self, game_id):
+        with self._locks_guard:
+            self._games.pop(game_id, None)
+            self._touched.pop(game_id, None)
+            self._finished.pop(game_id, None)
+            self._locks.pop(game_id, None)
+            queue = self._queued.pop(game_id, None)
+            if queue is not None:
+                waiting = self._waiting[queue]
+                waiting.remove(game_id)
+                if not waiting:
+                    del self._waiting[queue]
+
+    def _evict(self, game_id, reason):
+        with self._lock_for(game_id):
+            entry = self._games.get(game_id)
+            if entry is None:
+                return
+            self._archive(game_id, entry)
+            self.delete(game_id)
+            self._evicted[reason] += 1
+            self._evicted_hook(game_id, entry, reason)
+
+    def ids(self):
+        return list(self._games)
+
+    def last_touched(self, game_ids):
+        """Last write time of each of `game_ids` still held (changes whenever the game is saved)."""
+        with self._locks_guard:
+            return {game_id: self._touched[game_id] for game_id in game_ids if game_id in self._touched}
+
+    def next_number(self):
+        """A number never handed out before by this store (feeds the game code allocator)."""
+        with self._locks_guard:
+            self._next_number += 1
+            return self._next_number
+
+    def code_key(self):
+        """Secret key for the game code permutation, drawn when the store was created."""
+        return self._code_key
+
+    def match_waiting(self, queue, game_id):
+        """Take the longest-waiting lobby from `queue`, or queue `game_id` if nobody is waiting."""
+        with self._locks_guard:
+            waiting = self._waiting.get(queue)
+            while waiting:
+                other = waiting.popleft()
+                del self._queued[other]
+                if not waiting:
+                    del self._waiting[queue]   # a room nobody waits in any more costs nothing
+                if other != game_id:
+                    return other
+            self._waiting.setdefault(queue, deque()).append(game_id)
+            self._queued[game_id] = queue
+            return None
+
+    @contextmanager
+    def transaction(self, game_id):
+        """Hold the game's lock and yield its entry (None if it does not exist)."""
+        with self._lock_for(game_id):
+            entry = self._games.get(game_id)
+            yield entry
+            if entry is not None:
+                now = time.time()
+                with self._locks_guard:
+                    if game_id in self._touched:
+                        self._touched[game_id] = now
+                        self._touched.move_to_end(game_id)
+                        if entry_state(entry) == 'finished':
+                            self._finished.setdefault(game_id, now)
+
+    def sweep(self, now=None):
+        """Evict expired games. Returns the number evicted."""
+        now = now or time.time()
+        with self._locks_guard:
+            expired = []
+            for game_id, entry in self._games.items():
+                reason = self._expired(entry_state(entry), self._touched[game_id], self._finished.get(game_id), now)
+                if reason:
+                    expired.append((game_id, reason))
+        for game_id, reason in expired:
+            self._evict(game_id, reason)
+        return len(expired)
+
+    def stats(self):
+        with self._locks_guard:
+            states = Counter(entry_state(entry) for entry in self._games.values())
+            return {'games': len(self._games), 'lobby': states['lobby'], 'active': states['active'],
+                    'finished': states['finished'], 'evicted': dict(self._evicted)}
+
+    def history_totals(self):
+        """Log messages and round records held across all games."""
+        with self._locks_guard:
+            models = [entry['model'] for entry in self._games.values() if entry['model'] is not None]
+        return {'log': sum(len(model.log_events) for model in models),
+                'rounds': sum(len(model.round_stats) for model in models)}
+
+class SqliteGameStore(GameStore):
+    """Keeps entries as JSON rows in a SQLite file shared by all worker processes.
+
+    Each game has its own lock file (flock), so actions on different games never
+    wait on each other while two requests for the same game are serialized.
+    Each worker process opens at most `pool_size` connections, shared by its
+    threads or greenlets; each is lent for one statement or transaction.
+    """
+    shared = True
+
+    def __init__(self, path, pool_size=32, **options):
+        super().__init__(**options)
+        self.path = path
+        self.lock_dir = path + '.locks'
+        os.makedirs(self.lock_dir, exist_ok=True)
+        self._pool = ConnectionPool(self._connect, pool_size)
+        self._thread_locks = {}
+        self._thread_locks_guard = threading.Lock()
+        with self._pool.connection() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS games (game_id TEXT PRIMARY KEY, data TEXT NOT NULL, '
+                         'state TEXT NOT NULL, touched REAL NOT NULL, finished REAL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS games_state_touched ON games (state, touched)')
+            conn.execute('CREATE TABLE IF NOT EXISTS evictions (reason TEXT PRIMARY KEY, count INTEGER NOT NULL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            conn.execute("INSERT INTO counters (name, value) VALUES ('game_number', ?) ON CONFLICT DO NOTHING",
+                         (secrets.randbelow(1 << 30),))
+            conn.execute('CREATE TABLE IF NOT EXISTS secrets (name TEXT PRIMARY KEY, value BLOB NOT NULL)')
+            conn.execute("INSERT INTO secrets (name, value) VALUES ('code_key', ?) ON CONFLICT DO NOTHING",
+                         (secrets.token_bytes(32),))
+            conn.execute('CREATE TABLE IF NOT EXISTS waiting (game_id TEXT PRIMARY KEY, queue TEXT NOT NULL, '
+                         'since REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS waiting_queue_since ON waiting (queue, since)')
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _execute(self, sql, params=()):
+        """Run one statement on a pooled connection and return all its rows."""
+        return self._pool.run(lambda conn: conn.execute(sql, params).fetchall())
+
+    def __contains__(self, game_id):
+        return bool(self._execute('SELECT 1 FROM games WHERE game_id = ?', (game_id,)))
+
+    def __len__(self):
+        return self._execute('SELECT COUNT(*) FROM games')[0][0]
+
+    def get(self, game_id):
+        """Return a decoded snapshot of the entry. Changes to it are not saved."""
+        rows = self._execute('SELECT data FROM games WHERE game_id = ?', (game_id,))
+        return decode_entry(rows[0][0]) if rows else None
+
+    def add(self, game_id, entry):
+        if len(self) >= self.capacity:
+            victim = self._execute("SELECT game_id FROM games ORDER BY CASE state WHEN 'lobby' THEN 0 "
+                                   "WHEN 'finished' THEN 1 ELSE 2 END, touched LIMIT 1")
+            if victim:
+                self._evict(victim[0][0], 'capacity')
+        try:
+            self._execute('INSERT INTO games (game_id, data, state, touched) VALUES (?, ?, ?, ?)',
+                          (game_id, encode_entry(entry), entry_state(entry), time.time()))
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def delete(self, game_id):
+        def remove(conn):
+            conn.execute('DELETE FROM games WHERE game_id = ?', (game_id,))
+            conn.execute('DELETE FROM waiting WHERE game_id = ?', (game_id,))
+        self._pool.run(remove)
+        with self._thread_locks_guard:
+            self._thread_locks.pop(game_id, None)
+        try:
+            os.remove(os.path.join(self.lock_dir, game_id))
+        except OSError:
+            pass
+
+    def _evict(self, game_id, reason):
+        with self._game_lock(game_id):
+            entry = self.get(game_id)
+            if entry is None:
+                return   # another worker got there first
+            self._archive(game_id, entry)
+            def remove(conn):
+                conn.execute('DELETE FROM games WHERE game_id = ?', (game_id,))
+                conn.execute('INSERT INTO evictions (reason, count) VALUES (?, 1) '
+                             'ON CONFLICT (reason) DO UPDATE SET count = count + 1', (reason,))
+            self._pool.run(remove)
+        self.delete(game_id)
+        self._evicted_hook(game_id, entry, reason)
+
+    def ids(self):
+        return [row[0] for row in self._execute('SELECT game_id FROM games')]
+
+    def last_touched(self, game_ids):
+        """Last write time of each of `game_ids` still held, by any worker (one query per 500 games)."""
+        touched, game_ids = {}, list(game_ids)
+        for start in range(0, len(game_ids), 500):
+            batch = game_ids[start:start + 500]
+            touched.update(self._execute(f"SELECT game_id, touched FROM games WHERE game_id IN "
+                                         f"({', '.join('?' for _ in batch)})", batch))
+        return touched
+
+    def next_number(self):
+        """A number never handed out before by any worker sharing this database."""
+        return self._execute("UPDATE counters SET value = value + 1 WHERE name = 'game_number' RETURNING value")[0][0]
+
+    def code_key(self):
+        """Secret key for the game code permutation, drawn by the first worker and shared by all."""
+        return self._execute("SELECT value FROM secrets WHERE name = 'code_key'")[0][0]
+
+    def match_waiting(self, queue, game_id):
+        """Take the longest-waiting lobby from `queue`, or queue `game_id` if nobody is waiting (atomic across workers)."""
+        def match(conn):
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('SELECT w.game_id FROM waiting w JOIN games g ON g.game_id = w.game_id '
+                                   'WHERE w.queue = ? AND w.game_id != ? ORDER BY w.since LIMIT 1',
+                                   (queue, game_id)).fetchone()
+                if row:
+                    conn.execute('DELETE FROM waiting WHERE game_id = ?', row)
+                else:
+                    conn.execute('INSERT OR REPLACE INTO waiting (game_id, queue, since) VALUES (?, ?, ?)',
+                                 (game_id, queue, time.time()))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            return row[0] if row else None
+        return self._pool.run(match)
+
+    def _thread_lock_for(self, game_id):
+        with self._thread_locks_guard:
+            lock = self._thread_locks.get(game_id)
+            if lock is None:
+                lock = self._thread_locks[game_id] = threading.Lock()
+            return lock
+
+    @contextmanager
+    def _game_lock(self, game_id):
+        # flock serializes processes; the thread lock serializes threads of this process
+        with self._thread_lock_for(game_id):
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.lock_dir, game_id), 'a') as lock_file:
+                blocking(fcntl.flock, lock_file.fileno(), fcntl.LOCK_EX)   # may wait on another process
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @contextmanager
+    def transaction(self, game_id):
+        """Lock the game, yield a decoded entry and write it back when the block exits cleanly."""
+        with self._game_lock(game_id):
+            entry = self.get(game_id)
+            yield entry
+            if entry is not None:
+                state = entry_state(entry)
+                now = time.time()
+                self._execute(
+                    "UPDATE games SET data = ?, state = ?, touched = ?, "
+                    "finished = COALESCE(finished, CASE WHEN ? = 'finished' THEN ? END) WHERE game_id = ?",
+                    (encode_entry(entry), state, now, state, now, game_id))
+
+    def sweep(self, now=None):
+        """Evict expired games. Returns the number evicted."""
+        now = now or time.time()
+        rows = self._execute('SELECT game_id, state, touched, finished FROM games')
+        expired = []
+        for game_id, state, touched, finished in rows:
+            reason = self._expired(state, touched, finished, now)
+            if reason:
+                expired.append((game_id, reason))
+        for game_id, reason in expired:
+            self._evict(game_id, reason)
+        return len(expired)
+
+    def stats(self):
+        states = dict(self._execute('SELECT state, COUNT(*) FROM games GROUP BY state'))
+        return {'games': sum(states.values()), 'lobby': states.get('lobby', 0), 'active': states.get('active', 0),
+                'finished': states.get('finished', 0),
+                'evicted': dict(self._execute('SELECT reason, count FROM evictions'))}
+
+    def history_totals(self):
+        """Log messages and round records held across all games (counted inside SQLite)."""
+        log, values = self._execute(
+            "SELECT COALESCE(SUM(json_array_length(data, '$.model.log_events')), 0), "
+            "COALESCE(SUM(json_array_length(data, '$.model.round_stats')), 0) FROM games WHERE state != 'lobby'")[0]
+        return {'log': log, 'rounds': values // len(ROUND_FIELDS)}
+
+def create_store(url=None, **options):
+    """Build a store from a GAME_STORE url: 'memory' (default) or 'sqlite:///path/to/games.db'.
+
+    Limits not passed as options come from the GAME_CAPACITY, LOBBY_TTL,
+    IDLE_TTL and FINISHED_GRACE environment variables (TTLs in seconds), and
+    the SQLite store's connections per worker from SQLITE_POOL.
+    """
+    url = url or os.environ.get('GAME_STORE', 'memory')
+    for option, variable in (('capacity', 'GAME_CAPACITY'), ('lobby_ttl', 'LOBBY_TTL'),
+                             ('idle_ttl', 'IDLE_TTL'), ('finished_grace', 'FINISHED_GRACE')):
+        if option not in options and os.environ.get(variable):
+            options[option] = int(os.environ[variable])
+    if url == 'memory':
+        return MemoryGameStore(**options)
+    if url.startswith('sqlite:///'):
+        if os.environ.get('SQLITE_POOL'):
+            options.setdefault('pool_size', int(os.environ['SQLITE_POOL']))
+        return SqliteGameStore(url[len('sqlite:///'):], **options)
+    raise ValueError(f"Unknown GAME_STORE backend: {url}")
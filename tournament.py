@@ -0,0 +1,305 @@
+"""Round-robin tournament between scripted strategies, played with the real game rules.
+
+Every game is a `GameModel` driven through `GameModel.act`, the same code path
+as the web app's buttons, with the game's own seeded dice. For each variant,
+every ordered pair of different strategies (so each plays both seats) plays
+`--games` games. The games are split into chunks and fanned out over a
+process pool; every finished chunk is appended to the checkpoint file, so an
+interrupted run picks up where it stopped when started again with the same
+arguments.
+
+A strategy is a callable `strategy(model, player_idx, rng)`, called once per
+turn right after the player's harvest. It returns a dict with any of the keys
+'replant', 'buy_vp', 'buy_wc' and 'exchange' (missing keys mean 0), applied in
+that order like a player pressing the buttons; an amount the rules refuse is
+skipped. `rng` is a `random.Random` seeded per game. Strategies are the
+built-in names in STRATEGIES or 'module:function' for a plugin:
+
+    python tournament.py --games 200 --workers 4
+    python tournament.py --strategy greedy --strategy bot --strategy mystrategies:hoarder --checkpoint run.jsonl
+
+The report ranks the strategies per variant by win rate, with 95% Wilson
+confidence intervals for the win rate and normal ones for the mean score,
+followed by the head-to-head win rates.
+"""
+import argparse, hashlib, importlib, json, math, os, random, sys, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import permutations
+
+from models import GameModel, SCENARIO_NAMES, WOODCUTTER_COST, FOREST_MAX, MAX_ROUNDS
+import bot
+
+Z_95 = 1.959964   # two-sided 95% normal quantile
+
+# --- Built-in strategies ---
+
+def greedy_strategy(model, idx, rng):
+    """Turn every harvested tree into victory points."""
+    return {'buy_vp': model.players[idx].harvested_trees // 2}
+
+def expansion_strategy(model, idx, rng):
+    """Hire woodcutters during the first half, then cash in."""
+    trees = model.players[idx].harvested_trees
+    if model.current_round < MAX_ROUNDS // 2:
+        return {'buy_wc': trees // WOODCUTTER_COST}
+    return {'buy_vp': trees // 2}
+
+def sustainable_strategy(model, idx, rng):
+    """Replant to keep the forest full, sell the rest."""
+    trees = model.players[idx].harvested_trees
+    replant = min(trees, (FOREST_MAX - model.forest - model.replant_buffer) // 3)
+    return {'replant': replant, 'buy_vp': (trees - replant) // 2}
+
+def exchanger_strategy(model, idx, rng):
+    """Hire woodcutters early, then sell trees and exchange two woodcutters a round for points."""
+    trees = model.players[idx].harvested_trees
+    if model.current_round < MAX_ROUNDS // 3:
+        return {'buy_wc': trees // WOODCUTTER_COST}
+    return {'buy_vp': trees // 2, 'exchange': 2}
+
+def random_strategy(model, idx, rng):
+    """Random (possibly refused) amounts."""
+    trees = model.players[idx].harvested_trees
+    return {'replant': rng.randint(0, trees), 'buy_vp': rng.randint(0, trees // 2),
+            'buy_wc': rng.randint(0, trees // WOODCUTTER_COST), 'exchange': rng.randint(0, 2)}
+
+def bot_strategy(model, idx, rng):
+    """The single-player computer opponent's expectimax search (bot.py)."""
+    buy, replant, exchange, bank = bot.choose_plan(model, idx)
+    return {'replant': replant, 'buy_vp': bank, 'buy_wc': buy, 'exchange': exchange}
+
+STRATEGIES = {
+    'greedy': greedy_strategy,
+    'expansion': expansion_strategy,
+    'sustainable': sustainable_strategy,
+    'exchanger': exchanger_strategy,
+    'random': random_strategy,
+    'bot': bot_strategy,
+}
+# Played when no --strategy is given ('bot' searches every turn, so it is opt-in)
+DEFAULT_STRATEGIES = ('greedy', 'expansion', 'sustainable', 'exchanger', 'random')
+
+def load_strategy(name):
+    """A built-in strategy by name, or a plugin given as 'module:function'."""
+    if name in STRATEGIES:
+        return STRATEGIES[name]
+    module, _, function = name.partition(':')
+    if not function:
+        raise ValueError(f"unknown strategy {name!r} (built-in: {', '.join(STRATEGIES)}; plugins: module:function)")
+    return getattr(importlib.import_module(module), function)
+
+# --- Playing ---
+
+def play_game(variant, strategies, seed):
+    """Play one game between two strategies (Player 1, Player 2). Returns the finished GameModel."""
+    model = GameModel(variant, [{}, {}], seed=seed)
+    rngs = [random.Random(f"{seed}:{idx}") for idx in (0, 1)]
+    while not model.game_over:
+        idx = model.current_player
+        model.act(idx, 'harvest')
+        if model.game_over:
+            break   # the harvest depleted the forest
+        decision = strategies[idx](model, idx, rngs[idx])
+        # Refused amounts change nothing, as when a player asks for too much
+        for action in ('replant', 'buy_vp', 'buy_wc'):
+            if decision.get(action):
+                model.act(idx, action, decision[action])
+        for _ in range(decision.get('exchange', 0)):
+            model.act(idx, 'exchange')
+        model.act(idx, 'end_turn')
+    return model
+
+def game_seed(base_seed, variant, first, second, index):
+    """64-bit seed of one game, stable across runs, worker counts and chunk sizes."""
+    text = f"{base_seed}:{variant}:{first}:{second}:{index}"
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), 'big')
+
+def play_chunk(variant, first, second, start, count, base_seed):
+    """Play games start..start+count-1 of one matchup and return their totals (runs in a worker process)."""
+    strategies = (load_strategy(first), load_strategy(second))
+    totals = {'games': 0, 'wins': [0, 0], 'draws': 0, 'score': [0, 0], 'score_sq': [0, 0], 'collapsed': 0}
+    for index in range(start, start + count):
+        model = play_game(variant, strategies, game_seed(base_seed, variant, first, second, index))
+        scores = [player.victory_points for player in model.players]
+        totals['games'] += 1
+        if scores[0] == scores[1]:
+            totals['draws'] += 1
+        else:
+            totals['wins'][scores[1] > scores[0]] += 1
+        for seat in (0, 1):
+            totals['score'][seat] += scores[seat]
+            totals['score_sq'][seat] += scores[seat] ** 2
+        totals['collapsed'] += model.forest <= 0
+    return totals
+
+def chunk_key(variant, first, second, start):
+    return f"{variant}|{first}|{second}|{start}"
+
+def plan_chunks(variants, strategies, games, chunk_size):
+    for variant in variants:
+        for first, second in permutations(strategies, 2):
+            for start in range(0, games, chunk_size):
+                yield variant, first, second, start, min(chunk_size, games - start)
+
+def read_checkpoint(path, settings):
+    """Chunk results already in the checkpoint file, keyed by chunk_key. Refuses a file from other settings."""
+    done = {}
+    if not path or not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue   # torn line of an interrupted run; that chunk is played again
+            if number == 1:
+                if record.get('settings') != settings:
+                    raise SystemExit(f"{path} was written with other settings ({record.get('settings')}); "
+                                     f"use another --checkpoint file or the same arguments")
+                continue
+            done[record['key']] = record['totals']
+    return done
+
+def run(variants, strategies, games, chunk_size=50, workers=None, checkpoint=None, seed=0):
+    """Play the tournament and return {(variant, first, second): totals}, resuming from `checkpoint`."""
+    for name in strategies:
+        load_strategy(name)   # fail before starting the pool
+    settings = {'games': games, 'chunk_size': chunk_size, 'seed': seed}
+    done = read_checkpoint(checkpoint, settings)
+    chunks = [chunk for chunk in plan_chunks(variants, strategies, games, chunk_size)
+              if chunk_key(*chunk[:4]) not in done]
+    if done:
+        print(f"Resuming: {len(done)} chunks from {checkpoint}, {len(chunks)} to play", file=sys.stderr)
+    log = None
+    if checkpoint:
+        fresh = not os.path.exists(checkpoint) or os.path.getsize(checkpoint) == 0
+        if not fresh:
+            with open(checkpoint, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b'\n'
+        log = open(checkpoint, 'a')
+        if fresh:
+            log.write(json.dumps({'settings': settings}) + '\n')
+        elif torn:
+            log.write('\n')   # start after the torn line rather than on it
+    start_time = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(play_chunk, *chunk, seed): chunk for chunk in chunks}
+            for finished, future in enumerate(as_completed(futures), 1):
+                chunk = futures[future]
+                key = chunk_key(*chunk[:4])
+                done[key] = future.result()
+                if log is not None:
+                    log.write(json.dumps({'key': key, 'totals': done[key]}) + '\n')
+                    log.flush()
+                    os.fsync(log.fileno())
+                if finished % 20 == 0 or finished == len(chunks):
+                    print(f"  {finished}/{len(chunks)} chunks ({time.perf_counter() - start_time:.0f}s)", file=sys.stderr)
+    finally:
+        if log is not None:
+            log.close()
+    results = {}
+    for variant, first, second, start, _ in plan_chunks(variants, strategies, games, chunk_size):
+        totals = done[chunk_key(variant, first, second, start)]
+        merged = results.setdefault((variant, first, second), {'games': 0, 'wins': [0, 0], 'draws': 0,
+                                                               'score': [0, 0], 'score_sq': [0, 0], 'collapsed': 0})
+        for field in ('games', 'draws', 'collapsed'):
+            merged[field] += totals[field]
+        for field in ('wins', 'score', 'score_sq'):
+            for seat in (0, 1):
+                merged[field][seat] += totals[field][seat]
+    return results
+
+# --- Statistics ---
+
+def wilson_interval(successes, trials, z=Z_95):
+    """Wilson score interval for a binomial proportion."""
+    if trials == 0:
+        return 0.0, 1.0
+    p = successes / trials
+    denominator = 1 + z * z / trials
+    centre = (p + z * z / (2 * trials)) / denominator
+    half = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / denominator
+    return max(0.0, centre - half), min(1.0, centre + half)
+
+def mean_interval(total, total_sq, n, z=Z_95):
+    """Mean and the half-width of its normal confidence interval."""
+    if n == 0:
+        return 0.0, 0.0
+    mean = total / n
+    variance = max(total_sq / n - mean * mean, 0.0) * n / (n - 1) if n > 1 else 0.0
+    return mean, z * math.sqrt(variance / n)
+
+def standings(results, variant, strategies):
+    """Per strategy over all its games in `variant`: games, wins, draws, score sums, collapses."""
+    table = {name: {'games': 0, 'wins': 0, 'draws': 0, 'score': 0, 'score_sq': 0, 'collapsed': 0}
+             for name in strategies}
+    for (v, first, second), totals in results.items():
+        if v != variant:
+            continue
+        for seat, name in enumerate((first, second)):
+            row = table[name]
+            row['games'] += totals['games']
+            row['wins'] += totals['wins'][seat]
+            row['draws'] += totals['draws']
+            row['score'] += totals['score'][seat]
+            row['score_sq'] += totals['score_sq'][seat]
+            row['collapsed'] += totals['collapsed']
+    return table
+
+def report(results, variants, strategies):
+    lines = []
+    width = max(len(name) for name in strategies) + 2
+    for variant in variants:
+        table = standings(results, variant, strategies)
+        lines.append(f"\n{SCENARIO_NAMES[variant]} (variant {variant})")
+        lines.append(f"  {'strategy':<{width}}{'games':>7}  {'win rate [95% CI]':<24}{'draws':>7}  "
+                     f"{'mean score [95% CI]':<22}{'collapsed':>10}")
+        ranked = sorted(strategies, key=lambda name: table[name]['wins'] / max(table[name]['games'], 1), reverse=True)
+        for name in ranked:
+            row = table[name]
+            n = row['games']
+            low, high = wilson_interval(row['wins'], n)
+            mean, half = mean_interval(row['score'], row['score_sq'], n)
+            lines.append(f"  {name:<{width}}{n:>7}  {row['wins'] / max(n, 1):6.1%} [{low:6.1%}, {high:6.1%}]   "
+                         f"{row['draws'] / max(n, 1):6.1%}  {mean:7.2f} ± {half:<11.2f}{row['collapsed'] / max(n, 1):9.1%}")
+        # Head to head: row strategy's win rate against the column strategy, over both seatings
+        lines.append("  head to head (row beats column):")
+        lines.append('  ' + ' ' * width + ''.join(f"{name[:9]:>10}" for name in ranked))
+        for name in ranked:
+            cells = []
+            for other in ranked:
+                if other == name:
+                    cells.append(f"{'-':>10}")
+                    continue
+                as_first, as_second = results[(variant, name, other)], results[(variant, other, name)]
+                wins = as_first['wins'][0] + as_second['wins'][1]
+                cells.append(f"{wins / max(as_first['games'] + as_second['games'], 1):>10.1%}")
+            lines.append(f"  {name:<{width}}" + ''.join(cells))
+    return '\n'.join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Round-robin tournament between forest game strategies.")
+    parser.add_argument('--strategy', action='append',
+                        help=f"built-in ({', '.join(STRATEGIES)}) or module:function; repeat for each (default: "
+                             f"{', '.join(DEFAULT_STRATEGIES)})")
+    parser.add_argument('--variant', type=int, choices=sorted(SCENARIO_NAMES), action='append')
+    parser.add_argument('--games', type=int, default=100, help="games per ordered pair of strategies and variant")
+    parser.add_argument('--chunk-size', type=int, default=50, help="games per unit of work and checkpoint record")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument('--checkpoint', help="JSON-lines file for finished chunks; rerun with it to resume")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    strategies = list(dict.fromkeys(args.strategy or DEFAULT_STRATEGIES))
+    if len(strategies) < 2:
+        parser.error("a tournament needs at least two strategies")
+    variants = sorted(set(args.variant or SCENARIO_NAMES))
+    start = time.perf_counter()
+    results = run(variants, strategies, args.games, args.chunk_size, args.workers, args.checkpoint, args.seed)
+    total = sum(totals['games'] for totals in results.values())
+    print(f"{total} games in {time.perf_counter() - start:.1f}s")
+    print(report(results, variants, strategies))
+
+if __name__ == '__main__':
+    main()